@@ -0,0 +1,236 @@
+"""
+Microbenchmarks de las funciones calientes de parsing y render de match info.
+
+Mide ns/op y memoria asignada (pico de tracemalloc) por operación sobre un corpus
+sintético de partidos chicos, típicos y enormes, en layout plano y anidado en
+'matchData'. Los resultados se pueden guardar como baseline y comparar después:
+
+    python bench_parsers.py --save baseline.json
+    python bench_parsers.py --compare baseline.json --threshold 0.15
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+import tracemalloc
+
+import status_servers as bot
+
+# Tamaños del corpus: (jugadores por equipo, goles, otros eventos, períodos por jugador)
+CORPUS_SIZES = {
+    'small': (3, 1, 5, 1),
+    'typical': (6, 6, 60, 2),
+    'huge': (16, 40, 1500, 4),
+}
+LAYOUTS = ('flat', 'nested')
+
+MIN_BENCH_TIME = 0.2   # Segundos mínimos de medición por función y caso
+REPEATS = 5            # Se reporta la mejor de las repeticiones
+
+
+def make_payload(size, layout, seed=1234):
+    """Genera un payload sv_matchinfojson sintético con la forma real de IOSoccer"""
+    players_per_team, goals, other_events, periods_per_player = CORPUS_SIZES[size]
+    rng = random.Random(seed)
+    nested = layout == 'nested'
+
+    players = []
+    for team in ('home', 'away'):
+        for i in range(players_per_team):
+            steam_id = f"STEAM_0:{i % 2}:{rng.randint(10000, 99999)}"
+            name = f"{team.title()} Player {i + 1}"
+            periods = []
+            for _ in range(periods_per_player):
+                stats = [rng.randint(0, 5) for _ in range(20)]
+                if nested:
+                    periods.append({'info': {'team': team, 'position': 'CF'}, 'statistics': stats})
+                else:
+                    periods.append({'team': team, 'position': 'CF', 'stats': stats})
+            if nested:
+                players.append({'info': {'steamId': steam_id, 'name': name}, 'matchPeriodData': periods})
+            else:
+                players.append({'steamID': steam_id, 'name': name, 'periods': periods})
+    players.append({'info': {'steamId': 'BOT', 'name': 'Bot01'}} if nested else {'steamID': 'BOT', 'name': 'Bot01'})
+
+    event_key = 'type' if nested else 'event'
+    events = []
+    for i in range(goals + other_events):
+        scorer = rng.choice(players[:-1])
+        assist = rng.choice(players[:-1])
+        scorer_info = scorer['info'] if nested else scorer
+        assist_info = assist['info'] if nested else assist
+        scorer_id = scorer_info.get('steamId', scorer_info.get('steamID'))
+        assist_id = assist_info.get('steamId', assist_info.get('steamID'))
+        events.append({
+            event_key: 'GOAL' if i < goals else rng.choice(['FOUL', 'YELLOW', 'CORNER', 'OFFSIDE']),
+            'second': rng.randint(0, 5400),
+            'period': rng.choice(['FIRST HALF', 'SECOND HALF']),
+            'team': rng.choice(['home', 'away']),
+            'player1SteamId': scorer_id,
+            'player1Name': scorer_info['name'],
+            'player2SteamId': assist_id,
+            'player2Name': assist_info['name'],
+            'bodyPart': 1,
+            'startPosition': {'x': rng.random(), 'y': rng.random()},
+        })
+
+    teams = [{'matchTotal': {'name': 'Local FC', 'statistics': [0] * 20}},
+             {'matchTotal': {'name': 'Visitante FC', 'statistics': [0] * 20}}]
+
+    core = {
+        'matchPeriod': 'SECOND HALF',
+        'matchDisplaySeconds': '67:12',
+        'matchSeconds': 4032,
+        'teamNameHome': 'Local FC',
+        'teamNameAway': 'Visitante FC',
+        'matchGoalsHome': goals // 2,
+        'matchGoalsAway': goals - goals // 2,
+        'serverPlayerCount': players_per_team * 2,
+        'serverMaxPlayers': players_per_team * 2,
+        'matchFormat': players_per_team,
+        'mapName': '8v8_stadium',
+        'matchEvents': events,
+        'players': players,
+        'teams': teams,
+        'teamLineupHome': [{'steamId': f"HOME{i}", 'name': f"Home Player {i + 1}"} for i in range(players_per_team)],
+        'teamLineupAway': [{'steamId': f"AWAY{i}", 'name': f"Away Player {i + 1}"} for i in range(players_per_team)],
+    }
+    return {'matchData': core} if nested else core
+
+
+def payload_core(payload):
+    return payload.get('matchData', payload)
+
+
+def build_cases(payload):
+    """Devuelve [(nombre_función, callable sin argumentos)] para un payload"""
+    core = payload_core(payload)
+    events = core['matchEvents']
+    players = core['players']
+    teams = core['teams']
+
+    server_id = f"bench-{'nested' if 'matchData' in payload else 'flat'}"
+    match_info = bot.parse_match_info(payload, server_id)
+    plan = bot.schema_plans[server_id]
+    server_info = bot.ServerInfo(
+        name=bot.SERVERS[0]['name'],
+        status="🟢 Online",
+        players=match_info['players_count'],
+        max_players=match_info['max_players'],
+        map_name=match_info['map_name'],
+        match_info=bot.project_match_info(match_info),
+    )
+
+    return [
+        ('parse_match_info', lambda: bot.parse_match_info(payload, server_id)),
+        ('parse_goals_from_real_events', lambda: bot.parse_goals_from_real_events(events, plan)),
+        ('parse_goals_from_events_improved', lambda: bot.parse_goals_from_events_improved(events, players, teams, plan)),
+        ('count_real_players', lambda: bot.count_real_players(players, plan)),
+        ('extract_team_players_improved', lambda: bot.extract_team_players_improved(players, 'home', 'Local FC', plan=plan)),
+        ('get_player_goals_stats', lambda: bot.get_player_goals_stats(players, 'home', plan)),
+        ('render_match_embed', lambda: bot.render_match_embed(server_info)),
+        ('create_match_embed_improved', lambda: bot.create_match_embed_improved(server_info)),
+        ('create_status_embed', lambda: bot.create_status_embed([server_info] * len(bot.SERVERS))),
+    ]
+
+
+def time_function(fn):
+    """ns/op: calibra las iteraciones hasta MIN_BENCH_TIME y devuelve la mejor repetición"""
+    iterations = 1
+    while True:
+        started = time.perf_counter_ns()
+        for _ in range(iterations):
+            fn()
+        elapsed = time.perf_counter_ns() - started
+        if elapsed >= MIN_BENCH_TIME * 1e9 / REPEATS:
+            break
+        iterations *= 2
+
+    best = elapsed / iterations
+    for _ in range(REPEATS - 1):
+        started = time.perf_counter_ns()
+        for _ in range(iterations):
+            fn()
+        best = min(best, (time.perf_counter_ns() - started) / iterations)
+    return best, iterations
+
+
+def measure_allocations(fn):
+    """Bytes asignados por operación (pico de tracemalloc durante una llamada)"""
+    tracemalloc.start()
+    try:
+        fn()  # Calentar caches internas antes de medir
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(selected=None):
+    results = {}
+    for size in CORPUS_SIZES:
+        for layout in LAYOUTS:
+            payload = make_payload(size, layout)
+            for name, fn in build_cases(payload):
+                if selected and name not in selected:
+                    continue
+                ns_per_op, iterations = time_function(fn)
+                key = f"{name}[{size}/{layout}]"
+                results[key] = {
+                    'ns_per_op': round(ns_per_op, 1),
+                    'alloc_bytes_per_op': measure_allocations(fn),
+                    'iterations': iterations,
+                }
+                print(f"{key:<58} {ns_per_op:>14,.0f} ns/op {results[key]['alloc_bytes_per_op']:>12,} B/op")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Imprime la variación contra el baseline. Returns: cantidad de regresiones"""
+    regressions = 0
+    print()
+    print(f"{'caso':<58} {'baseline':>14} {'actual':>14} {'Δ':>8}")
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        change = current['ns_per_op'] / previous['ns_per_op'] - 1
+        flag = ''
+        if change > threshold:
+            regressions += 1
+            flag = '  ⚠️ REGRESIÓN'
+        print(f"{key:<58} {previous['ns_per_op']:>14,.0f} {current['ns_per_op']:>14,.0f} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks de parsing de match info")
+    parser.add_argument('--only', nargs='*', help="Medir solo estas funciones")
+    parser.add_argument('--save', help="Guardar resultados como baseline JSON")
+    parser.add_argument('--compare', help="Comparar contra un baseline JSON")
+    parser.add_argument('--threshold', type=float, default=0.15, help="Regresión tolerada (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    # Los logs por llamada dominarían la medición
+    bot.logger.setLevel(logging.WARNING)
+
+    results = run_benchmarks(set(args.only) if args.only else None)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version, 'results': results}, f, indent=2)
+        print(f"\n💾 Baseline guardado en {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,173 @@
 import discord
 from discord.ext import commands, tasks
+from aiohttp import web
 import asyncio
 import socket
 import struct
 from datetime import datetime
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
 import re
 import json
 import time
-from rcon import Client
+import heapq
+import math
 import logging
 import os
+import sys
+import base64
+import ipaddress
+import io
+import threading
+import queue
+import cProfile
+import pstats
+import tracemalloc
 
 # ============= CONFIGURACIÓN GLOBAL PARA AUTO-UPDATE =============
 active_status_channels = {}  # Diccionario para rastrear canales con auto-update activo
-# Estructura: {channel_id: {'message': message_object, 'task': task_object}}
+# Estructura: {channel_id: {'messages': [message_object], 'channel': channel_object, 'task': task_object}}
 
 # Cambiar estas líneas:
 TOKEN = os.getenv('DISCORD_TOKEN')
 RCON_PASSWORD = os.getenv('RCON_PASSWORD')
 
 # Configurar logging para debug
-logging.basicConfig(level=logging.INFO)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()                 # 'text' o 'json' (una línea JSON por evento)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_RATE_PER_MINUTE = int(os.getenv('LOG_RATE_PER_MINUTE', '60'))    # Por tipo de mensaje; 0 = sin límite
+LOG_RING_SIZE = int(os.getenv('LOG_RING_SIZE', '50'))                # Eventos recientes guardados por servidor
+LOG_SAMPLER_MAX_KEYS = 1024
+# Muestreo por tipo de evento ("tipo=fracción,..."): se emite 1 de cada 1/fracción
+LOG_SAMPLING = {
+    event: float(rate)
+    for event, rate in (
+        item.split('=', 1) for item in
+        os.getenv('LOG_SAMPLING', 'rcon_attempt=0.1,rcon_wait=0.1,port_probe=0.2').split(',') if '=' in item
+    )
+}
+
+class TextLogFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        return f"{text} (+{suppressed} suprimidos)" if suppressed else text
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in ('server', 'event', 'suppressed'):
+            value = getattr(record, field, None)
+            if value:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class LogSampler(logging.Filter):
+    """
+    Muestreo y límite por tipo de mensaje (extra 'event' o, si no hay, la plantilla sin formatear).
+    Los errores nunca se descartan; lo suprimido se informa en el siguiente mensaje emitido del mismo tipo.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._state = {}  # tipo -> [inicio de ventana, emitidos, suprimidos, vistos]
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR:
+            return True
+        
+        event = getattr(record, 'event', None)
+        key = event or record.msg
+        state = self._state.get(key)
+        if state is None:
+            if len(self._state) >= LOG_SAMPLER_MAX_KEYS:
+                self._state.clear()
+            state = [record.created, 0, 0, 0]
+            self._state[key] = state
+        
+        state[3] += 1
+        rate = LOG_SAMPLING.get(event) if event else None
+        if rate is not None and rate < 1 and (state[3] - 1) % max(1, round(1 / rate)):
+            state[2] += 1
+            return False
+        
+        if record.created - state[0] >= 60:
+            state[0] = record.created
+            state[1] = 0
+        if LOG_RATE_PER_MINUTE and state[1] >= LOG_RATE_PER_MINUTE:
+            state[2] += 1
+            return False
+        
+        state[1] += 1
+        if state[2]:
+            record.suppressed = state[2]
+            state[2] = 0
+        return True
+
+class ServerLogRing(logging.Handler):
+    """Últimos eventos por servidor, sin formatear hasta que alguien los pide (!diagnose)"""
+
+    def __init__(self, size=LOG_RING_SIZE):
+        super().__init__(level=logging.INFO)
+        self.size = size
+        self.rings = {}  # servidor -> deque[(created, levelname, msg, args)]
+
+    def emit(self, record):
+        server = getattr(record, 'server', None)
+        if server is None:
+            return
+        ring = self.rings.get(server)
+        if ring is None:
+            ring = self.rings[server] = deque(maxlen=self.size)
+        ring.append((record.created, record.levelname, record.msg, record.args))
+
+    def recent(self, servers, limit=10):
+        """Eventos más recientes de varias claves de servidor, ya formateados"""
+        entries = heapq.nlargest(limit, (entry for server in set(servers) for entry in self.rings.get(server, ())),
+                                 key=lambda entry: entry[0])
+        lines = []
+        for created, levelname, msg, args in reversed(entries):
+            try:
+                text = str(msg) % args if args else str(msg)
+            except (TypeError, ValueError):
+                text = str(msg)
+            lines.append((created, levelname, text))
+        return lines
+
+class ServerLogAdapter(logging.LoggerAdapter):
+    """Etiqueta cada registro con el servidor; combina el extra de la llamada en vez de reemplazarlo"""
+
+    def process(self, msg, kwargs):
+        kwargs['extra'] = {**self.extra, **kwargs['extra']} if 'extra' in kwargs else self.extra
+        return msg, kwargs
+
 logger = logging.getLogger(__name__)
+server_log_ring = ServerLogRing()
+
+def server_logger(server):
+    return ServerLogAdapter(logger, {'server': server})
+
+def configure_logging():
+    handler = logging.StreamHandler()
+    if LOG_FORMAT == 'json':
+        handler.setFormatter(JsonLogFormatter())
+    else:
+        handler.setFormatter(TextLogFormatter(logging.BASIC_FORMAT))
+    handler.addFilter(LogSampler())
+    
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    logger.addHandler(server_log_ring)
+
+configure_logging()
 
 # Comandos específicos de IOSoccer optimizados
 IOSOCCER_COMMANDS = [
@@ -63,6 +209,192 @@ SERVERS = [
         'max_connection_time': 120,  # Tiempo máximo total de conexión
     }
 ]
+
+# ============= SERVIDORES POR GUILD =============
+# Cada guild puede registrar su propia lista; sin lista propia ve SERVERS. Las entradas se
+# deduplican por (ip, port): un servidor vigilado por muchas guilds se sondea una sola vez y
+# todas leen el mismo snapshot, cada una con el nombre que le puso.
+# RCON_PASSWORD solo se usa con SERVERS: un servidor agregado por una guild es solo A2S hasta
+# que la guild configura su propia contraseña RCON, y no se aceptan direcciones internas.
+GUILD_SERVERS_FILE = os.getenv('GUILD_SERVERS_FILE', 'guild_servers.json')
+MAX_SERVERS_PER_GUILD = int(os.getenv('MAX_SERVERS_PER_GUILD', '10'))
+
+class GuildServerRegistry:
+    """Listas de servidores por guild sobre configuraciones compartidas por dirección"""
+
+    def __init__(self, path=GUILD_SERVERS_FILE, defaults=SERVERS):
+        self.path = path
+        self.defaults = defaults
+        self.shared = {(server['ip'], server['port']): server for server in defaults}  # (ip, port) -> server sondeado
+        self.guilds = {}  # guild_id (str) -> [server] con el nombre propio de la guild y el 'id' compartido
+        self.load()
+
+    def servers_for(self, guild_id):
+        if guild_id is None:
+            return self.defaults
+        return self.guilds.get(str(guild_id)) or self.defaults
+
+    def polled_servers(self):
+        """Un server por dirección: los de SERVERS más los registrados por alguna guild"""
+        addresses = dict.fromkeys((server['ip'], server['port']) for server in self.defaults)
+        for servers in self.guilds.values():
+            addresses.update(dict.fromkeys((server['ip'], server['port']) for server in servers))
+        return [self.shared[address] for address in addresses]
+
+    def guild_ids_watching(self, key):
+        """Guilds cuya lista incluye el servidor `key` (None = las que usan SERVERS)"""
+        watching = set()
+        if any(server.get('id') == key for server in self.defaults):
+            watching.add(None)
+        for guild_id, servers in self.guilds.items():
+            if any(server.get('id') == key for server in servers):
+                watching.add(guild_id)
+        return watching
+
+    def _shared_server(self, ip, port, name):
+        server = self.shared.get((ip, port))
+        if server is None:
+            server = {
+                'name': name,
+                'ip': ip,
+                'port': port,
+                'rcon_ports': [],        # Solo A2S hasta que la guild configure RCON (la lista se comparte con las vistas)
+                'rcon_password': None,   # Nunca RCON_PASSWORD
+                'id': f"{ip}:{port}",
+                'max_connection_time': 120,
+            }
+            self.shared[(ip, port)] = server
+        return server
+
+    def set_rcon(self, guild_id, index, rcon_port=None, password=None):
+        """
+        Configura (o con password=None quita) la RCON propia del servidor `index` (base 0) de la guild.
+        Returns: el server compartido. Lanza ValueError para los servidores de SERVERS.
+        """
+        entry = self.guilds.get(str(guild_id), [])[index]
+        shared = self.shared[(entry['ip'], entry['port'])]
+        if 'rcon_password' not in shared:
+            raise ValueError("Este servidor es de la lista por defecto y ya tiene RCON configurado")
+        # Las sesiones abiertas con la configuración anterior no deben seguir vivas
+        for port in shared['rcon_ports']:
+            rcon_pool.evict(shared['ip'], port)
+        shared['rcon_ports'][:] = [rcon_port] if password else []
+        shared['rcon_password'] = password or None
+        self.save()
+        return shared
+
+    def add(self, guild_id, ip, port, name):
+        """
+        Agrega un servidor a la lista de la guild. Si otra guild ya vigila esa dirección
+        se reutiliza su configuración (y su snapshot).
+        Returns: la entrada de la guild. Lanza ValueError si no se puede agregar.
+        """
+        servers = self.guilds.get(str(guild_id), [])
+        if len(servers) >= MAX_SERVERS_PER_GUILD:
+            raise ValueError(f"Máximo {MAX_SERVERS_PER_GUILD} servidores por guild")
+        if any((server['ip'], server['port']) == (ip, port) for server in servers):
+            raise ValueError(f"{ip}:{port} ya está en la lista")
+        
+        entry = dict(self._shared_server(ip, port, name), name=name)
+        self.guilds[str(guild_id)] = servers + [entry]
+        self.save()
+        return entry
+
+    def remove(self, guild_id, index):
+        """
+        Quita la entrada `index` (base 0) de la guild; una lista vacía vuelve a SERVERS.
+        Returns: (entrada quitada, server compartido si ya nadie lo vigila o None)
+        """
+        servers = list(self.guilds.get(str(guild_id), []))
+        entry = servers.pop(index)
+        if servers:
+            self.guilds[str(guild_id)] = servers
+        else:
+            self.guilds.pop(str(guild_id), None)
+        
+        address = (entry['ip'], entry['port'])
+        orphan = None
+        if address not in {(server['ip'], server['port']) for server in self.polled_servers()}:
+            orphan = self.shared.pop(address)
+        self.save()
+        return entry, orphan
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"❌ No se pudieron cargar los servidores por guild de {self.path}: {e}")
+            return
+
+        for guild_id, entries in data.get('guilds', {}).items():
+            servers = []
+            for entry in entries:
+                shared = self._shared_server(entry['ip'], entry['port'], entry['name'])
+                servers.append(dict(shared, name=entry['name']))
+            if servers:
+                self.guilds[guild_id] = servers
+        # RCON propia por dirección (las entradas sin contraseña quedan en solo A2S)
+        for address, rcon in data.get('rcon', {}).items():
+            ip, _, port = address.rpartition(':')
+            shared = self.shared.get((ip, int(port)))
+            if shared is not None and 'rcon_password' in shared and rcon.get('password'):
+                shared['rcon_ports'][:] = rcon['ports']
+                shared['rcon_password'] = rcon['password']
+        logger.info(f"🗂️ Servidores de {len(self.guilds)} guilds cargados desde {self.path}")
+
+    def save(self):
+        data = {
+            'guilds': {
+                guild_id: [{'name': server['name'], 'ip': server['ip'], 'port': server['port']} for server in servers]
+                for guild_id, servers in self.guilds.items()
+            },
+            'rcon': {
+                server['id']: {'ports': server['rcon_ports'], 'password': server['rcon_password']}
+                for server in self.shared.values() if server.get('rcon_password')
+            },
+        }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"❌ No se pudieron guardar los servidores por guild en {self.path}: {e}")
+
+server_registry = GuildServerRegistry()
+
+def servers_for_guild(guild):
+    return server_registry.servers_for(guild.id if guild else None)
+
+def rcon_password_for(server):
+    """Contraseña RCON: la del bot para SERVERS, la propia de la guild (o None) para los agregados"""
+    shared = server_registry.shared.get((server['ip'], server['port']), server)
+    return shared['rcon_password'] if 'rcon_password' in shared else RCON_PASSWORD
+
+def rcon_enabled(server):
+    return bool(server.get('rcon_ports')) and rcon_password_for(server) is not None
+
+async def resolve_public_ip(host, port):
+    """
+    IPv4 pública de `host` (literal o nombre, resuelto una sola vez para que no cambie después).
+    Lanza ValueError si el puerto es inválido o la dirección es loopback, privada, link-local, etc.
+    """
+    if not 0 < port < 65536:
+        raise ValueError(f"Puerto inválido: {port}")
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    except socket.gaierror:
+        raise ValueError(f"No se pudo resolver {host}")
+    addresses = {ipaddress.ip_address(info[4][0]) for info in infos}
+    if not addresses:
+        raise ValueError(f"No se pudo resolver {host}")
+    for address in addresses:
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"{host} apunta a una dirección no pública ({address})")
+    return str(min(addresses))
         
 # Bot configuration
 intents = discord.Intents.default()
@@ -71,8 +403,10 @@ bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)
 
 class ServerInfo:
     """Clase para almacenar información del servidor"""
+    __slots__ = ('name', 'status', 'players', 'max_players', 'map_name', 'match_info', 'basic_info', 'address')
+    
     def __init__(self, name, status, players=0, max_players=0, map_name="N/A", 
-                 match_info=None, basic_info=None):
+                 match_info=None, basic_info=None, address=None):
         self.name = name
         self.status = status
         self.players = players
@@ -80,230 +414,1127 @@ class ServerInfo:
         self.map_name = map_name
         self.match_info = match_info  # JSON data del partido
         self.basic_info = basic_info  # Info básica A2S
+        self.address = address        # ip:puerto del snapshot (para "Conectar"; el nombre depende de la guild)
+
+# ============= TRAZAS POR ETAPA (FORMATO CHROME TRACE) =============
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '5000'))  # Spans guardados en memoria
+
+class Tracer:
+    """Spans livianos en un ring buffer, exportables como trace de Chrome/Perfetto"""
+
+    def __init__(self, max_spans=TRACE_BUFFER_SIZE):
+        self.spans = deque(maxlen=max_spans)  # (nombre, pista, inicio_ns, duración_ns, args)
+
+    @contextmanager
+    def span(self, name, track='bot', **args):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.spans.append((name, track, start, time.perf_counter_ns() - start, args))
+
+    def to_chrome_trace(self):
+        """Formato 'Trace Event' (chrome://tracing, ui.perfetto.dev): una fila por pista"""
+        pid = os.getpid()
+        track_ids = {}
+        events = []
+        for name, track, start, duration, args in list(self.spans):
+            if track not in track_ids:
+                track_ids[track] = len(track_ids) + 1
+                events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                               'tid': track_ids[track], 'args': {'name': str(track)}})
+            events.append({'name': name, 'cat': 'bot', 'ph': 'X', 'pid': pid, 'tid': track_ids[track],
+                           'ts': start / 1000, 'dur': duration / 1000, 'args': args})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+tracer = Tracer()
+
+# ============= PERFILADO BAJO DEMANDA (cProfile + tracemalloc) =============
+PROFILE_MAX_SECONDS = 1800
+PROFILE_REPORT_LINES = 40
+
+class ProfileSession:
+    """Perfila el bot en vivo durante N ciclos de actualización o una ventana de tiempo"""
+
+    def __init__(self, channel, cycles, seconds):
+        self.channel = channel
+        self.cycles = cycles        # 0 = solo ventana de tiempo
+        self.seconds = seconds
+        self.cycles_done = 0
+        self.started_at = None
+        self.profiler = cProfile.Profile()
+        self.start_snapshot = None
+        self.owns_tracemalloc = False
+        self.timer_task = None
+        self.finished = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            self.owns_tracemalloc = True
+        self.start_snapshot = tracemalloc.take_snapshot()
+        self.started_at = time.time()
+        self.profiler.enable()
+        self.timer_task = asyncio.create_task(self._expire())
+
+    async def _expire(self):
+        await asyncio.sleep(self.seconds)
+        await self.finish()
+
+    def on_cycle_finished(self):
+        self.cycles_done += 1
+        if self.cycles and self.cycles_done >= self.cycles:
+            asyncio.create_task(self.finish())
+
+    async def finish(self):
+        global active_profile
+        if self.finished:
+            return
+        self.finished = True
+        self.profiler.disable()
+        
+        end_snapshot = tracemalloc.take_snapshot()
+        if self.owns_tracemalloc:
+            tracemalloc.stop()
+        if self.timer_task and self.timer_task is not asyncio.current_task():
+            self.timer_task.cancel()
+        if active_profile is self:
+            active_profile = None
+        
+        elapsed = time.time() - self.started_at
+        report = self.build_report(end_snapshot, elapsed)
+        filename = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        logger.info(f"🩺 Perfilado terminado: {self.cycles_done} ciclos en {elapsed:.1f}s")
+        try:
+            await self.channel.send(
+                f"🩺 Perfilado terminado: **{self.cycles_done}** ciclos en **{elapsed:.1f}s**",
+                file=discord.File(io.BytesIO(report.encode('utf-8')), filename=filename)
+            )
+        except Exception as e:
+            logger.error(f"❌ Error enviando reporte de perfilado: {e}")
+
+    def build_report(self, end_snapshot, elapsed):
+        out = io.StringIO()
+        out.write(f"Perfilado: {self.cycles_done} ciclos, {elapsed:.1f}s\n\n")
+        
+        out.write("=" * 30 + " FUNCIONES (tiempo acumulado) " + "=" * 30 + "\n")
+        stats = pstats.Stats(self.profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(PROFILE_REPORT_LINES)
+        out.write("=" * 30 + " FUNCIONES (tiempo propio) " + "=" * 30 + "\n")
+        stats.sort_stats('tottime').print_stats(PROFILE_REPORT_LINES)
+        
+        out.write("=" * 30 + " ASIGNACIONES (diferencia) " + "=" * 30 + "\n")
+        ignore_tracemalloc = (tracemalloc.Filter(False, tracemalloc.__file__),)
+        diff = end_snapshot.filter_traces(ignore_tracemalloc).compare_to(
+            self.start_snapshot.filter_traces(ignore_tracemalloc), 'lineno'
+        )
+        for stat in diff[:PROFILE_REPORT_LINES]:
+            out.write(f"{stat}\n")
+        return out.getvalue()
+
+active_profile = None  # ProfileSession en curso (solo uno a la vez)
+
+def profile_cycle_finished():
+    """Avisa al perfilado en curso que terminó un ciclo de actualización"""
+    if active_profile is not None:
+        active_profile.on_cycle_finished()
+
+# ============= CAPTURA Y REPRODUCCIÓN DE TRÁFICO (FIXTURES) =============
+CAPTURE_DIR = os.getenv('CAPTURE_DIR')  # Si está definido, se captura desde el arranque
+
+class TrafficRecorder:
+    """
+    Graba cada datagrama A2S y cada respuesta RCON en un archivo JSONL del directorio de fixtures.
+    record() solo encola la línea; un hilo escritor la vuelca al disco (un disco lento no frena el loop).
+    """
+
+    def __init__(self):
+        self.path = None
+        self.records = 0
+        self._queue = None  # Líneas pendientes para el hilo escritor (None = sin captura)
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self._queue is not None
+
+    def start(self, directory):
+        self.stop()
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"capture_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+        self.records = 0
+        file = open(self.path, 'a', encoding='utf-8')
+        self._queue = queue.SimpleQueue()
+        threading.Thread(target=self._write_loop, args=(file, self._queue), name='traffic-recorder', daemon=True).start()
+        logger.info(f"🎙️ Captura de tráfico iniciada en {self.path}")
+
+    def stop(self):
+        with self._lock:
+            if self._queue is not None:
+                self._queue.put(None)  # El escritor vacía la cola y cierra el archivo
+                self._queue = None
+                logger.info(f"🎙️ Captura detenida: {self.records} registros en {self.path}")
+
+    @staticmethod
+    def _write_loop(file, lines):
+        """Hilo escritor: escribe en lotes lo que haya en la cola y hace flush al vaciarla"""
+        with file:
+            while True:
+                batch = [lines.get()]
+                while batch[-1] is not None:
+                    try:
+                        batch.append(lines.get_nowait())
+                    except queue.Empty:
+                        break
+                file.writelines(line for line in batch if line is not None)
+                file.flush()
+                if batch[-1] is None:
+                    return
+
+    def record(self, kind, host, data, command=None):
+        if self._queue is None:
+            return
+        entry = {'ts': time.time(), 'kind': kind, 'host': host}
+        if kind == 'a2s':
+            entry['data'] = base64.b64encode(data).decode('ascii')
+        else:
+            entry['command'] = command
+            entry['response'] = data
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._queue is not None:
+                self._queue.put(line)
+                self.records += 1
+
+traffic_recorder = TrafficRecorder()
+
+def replay_fixtures(path):
+    """
+    Reproduce a máxima velocidad el tráfico capturado (archivo o directorio de .jsonl):
+    A2S -> A2SQuery.parse_info_response, sv_matchinfojson -> extract_json_text + json.loads
+    + parse_match_info + create_match_embed_improved. No toca la red.
+    Returns: {'records': int, 'a2s': int, 'matchinfo': int, 'errors': [...], 'timings': {etapa: segundos}}
+    """
+    if os.path.isdir(path):
+        files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.jsonl'))
+    else:
+        files = [path]
+    
+    result = {'records': 0, 'a2s': 0, 'matchinfo': 0, 'errors': [], 'timings': {
+        'a2s_parse': 0.0, 'json_loads': 0.0, 'parse_match_info': 0.0, 'embed_build': 0.0,
+    }}
+    timings = result['timings']
+    
+    for file_path in files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                where = f"{os.path.basename(file_path)}:{line_number}"
+                result['records'] += 1
+                try:
+                    entry = json.loads(line)
+                    
+                    if entry['kind'] == 'a2s':
+                        data = base64.b64decode(entry['data'])
+                        started = time.perf_counter()
+                        info = A2SQuery.parse_info_response(data)
+                        timings['a2s_parse'] += time.perf_counter() - started
+                        result['a2s'] += 1
+                        if info is None:
+                            result['errors'].append(f"{where}: A2S_INFO incompleto ({len(data)} bytes)")
+                        continue
+                    
+                    if 'matchinfo' not in (entry.get('command') or '').lower():
+                        continue
+                    result['matchinfo'] += 1
+                    
+                    json_text = extract_json_text(entry['response'])
+                    if json_text is None:
+                        result['errors'].append(f"{where}: JSON no encontrado")
+                        continue
+                    
+                    started = time.perf_counter()
+                    match_data = json.loads(json_text)
+                    timings['json_loads'] += time.perf_counter() - started
+                    
+                    started = time.perf_counter()
+                    match_info = parse_match_info(match_data)
+                    timings['parse_match_info'] += time.perf_counter() - started
+                    if match_info is None:
+                        result['errors'].append(f"{where}: parse_match_info devolvió None")
+                        continue
+                    
+                    server_info = ServerInfo(
+                        name=entry['host'],
+                        status="🟢 Online",
+                        players=match_info['players_count'],
+                        max_players=match_info['max_players'],
+                        map_name=match_info['map_name'],
+                        match_info=project_match_info(match_info)
+                    )
+                    started = time.perf_counter()
+                    create_match_embed_improved(server_info)
+                    timings['embed_build'] += time.perf_counter() - started
+                    
+                except Exception as e:
+                    result['errors'].append(f"{where}: {type(e).__name__}: {e}")
+    
+    return result
+
+# ============= SALUD POR SERVIDOR (TIMEOUTS ADAPTATIVOS) =============
+HEALTH_EWMA_ALPHA = 0.2          # Peso de cada muestra nueva
+HEALTH_MIN_SAMPLES = 3           # Muestras necesarias antes de confiar en el EWMA
+HEALTH_P99_Z = 2.33              # p99 ≈ media + 2.33 desviaciones
+HEALTH_P95_Z = 1.645             # p95 ≈ media + 1.645 desviaciones
+HEALTH_TIMEOUT_MARGIN = 2.0      # Segundos extra sobre el p99 estimado
+HEALTH_RETRY_BACKOFF = 1.5       # Multiplicador del timeout por cada reintento
+
+# Tipo de operación -> (timeout inicial sin datos, mínimo, máximo)
+HEALTH_TIMEOUT_LIMITS = {
+    'a2s': (12, 2, 12),
+    'rcon': (10, 3, 30),
+    'matchinfo': (20, 5, 60),
+}
+
+class ServerHealth:
+    """Latencia EWMA, varianza y tasa de fallos de un tipo de operación contra un servidor"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.samples = 0
+        self.latency = 0.0
+        self.variance = 0.0
+        self.failure_rate = 0.0
+
+    def record_success(self, latency):
+        if self.samples == 0:
+            self.latency = latency
+        else:
+            diff = latency - self.latency
+            increment = HEALTH_EWMA_ALPHA * diff
+            self.latency += increment
+            self.variance = (1 - HEALTH_EWMA_ALPHA) * (self.variance + diff * increment)
+        self.samples += 1
+        self.failure_rate *= (1 - HEALTH_EWMA_ALPHA)
+
+    def record_failure(self):
+        self.failure_rate = (1 - HEALTH_EWMA_ALPHA) * self.failure_rate + HEALTH_EWMA_ALPHA
+
+    def percentile(self, z):
+        return self.latency + z * math.sqrt(self.variance)
+
+    def timeout(self, attempt=1):
+        """Timeout para el intento `attempt`: p99 + margen, creciendo con los fallos y reintentos"""
+        initial, minimum, maximum = HEALTH_TIMEOUT_LIMITS[self.kind]
+        if self.samples < HEALTH_MIN_SAMPLES:
+            base = initial
+        else:
+            base = (self.percentile(HEALTH_P99_Z) + HEALTH_TIMEOUT_MARGIN) * (1 + self.failure_rate)
+        timeout = base * HEALTH_RETRY_BACKOFF ** (attempt - 1)
+        return round(min(maximum, max(minimum, timeout)), 1)
+
+    def describe(self):
+        if self.samples == 0:
+            return f"sin datos, fallos {self.failure_rate:.0%}"
+        return f"{self.latency:.2f}s ±{math.sqrt(self.variance):.2f}s, fallos {self.failure_rate:.0%}"
+
+server_health = {}  # (ip, port, tipo) -> ServerHealth
+
+def get_server_health(ip, port, kind):
+    key = (ip, port, kind)
+    if key not in server_health:
+        server_health[key] = ServerHealth(kind)
+    return server_health[key]
+
+def rcon_command_kind(command):
+    return 'matchinfo' if 'matchinfo' in command.lower() else 'rcon'
 
 class A2SQuery:
-    """Clase para consultas A2S_INFO con timeouts aumentados"""
+    """Clase para consultas A2S_INFO con timeouts adaptativos"""
     
     @staticmethod
-    def query_server(ip, port, timeout=12):  # Timeout aumentado de 5 a 12
-        """Consulta información básica del servidor usando A2S_INFO con timeout aumentado"""
+    def query_server(ip, port, timeout=None):
+        """Consulta información básica del servidor usando A2S_INFO (timeout derivado de la salud si no se indica)"""
+        health = get_server_health(ip, port, 'a2s')
+        log = server_logger(f"{ip}:{port}")
+        if timeout is None:
+            timeout = health.timeout()
+        
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock.settimeout(timeout)  # Timeout más generoso
+            sock.settimeout(timeout)
             
             # Packet A2S_INFO
             packet = b'\xFF\xFF\xFF\xFF\x54Source Engine Query\x00'
-            sock.sendto(packet, (ip, port))
-            data, addr = sock.recvfrom(4096)
-            sock.close()
-            
-            if len(data) < 25:
-                return None
-                
-            offset = 6  # Skip header and protocol
-            
-            # Server name
-            name_end = data.find(b'\x00', offset)
-            if name_end == -1: return None
-            server_name = data[offset:name_end].decode('utf-8', errors='ignore')
-            offset = name_end + 1
-            
-            # Map name
-            map_end = data.find(b'\x00', offset)
-            if map_end == -1: return None
-            map_name = data[offset:map_end].decode('utf-8', errors='ignore')
-            offset = map_end + 1
-            
-            # Skip folder and game
-            for _ in range(2):
-                end = data.find(b'\x00', offset)
-                if end == -1: return None
-                offset = end + 1
-            
-            # Skip ID (2 bytes)
-            offset += 2
-            
-            # Players and max_players
-            if offset + 1 >= len(data): return None
-            players = data[offset]
-            max_players = data[offset + 1]
-            
-            logger.info(f"✅ A2S_INFO PERSISTENTE {ip}:{port} -> {players}/{max_players} en {map_name}")
+            sent_at = time.monotonic()
+            try:
+                sock.sendto(packet, (ip, port))
+                data, addr = sock.recvfrom(4096)
+            except OSError:
+                health.record_failure()
+                raise
+            finally:
+                sock.close()
+            health.record_success(time.monotonic() - sent_at)
+            traffic_recorder.record('a2s', f"{ip}:{port}", data)
             
-            return {
-                'server_name': server_name,
-                'map_name': map_name,
-                'players': players,
-                'max_players': max_players
-            }
+            info = A2SQuery.parse_info_response(data)
+            if info:
+                log.info("✅ A2S_INFO PERSISTENTE %s:%s -> %s/%s en %s", ip, port,
+                         info['players'], info['max_players'], info['map_name'], extra={'event': 'a2s_ok'})
+            return info
                 
         except Exception as e:
-            logger.error(f"❌ A2S_INFO PERSISTENTE error {ip}:{port}: {e}")
+            log.error("❌ A2S_INFO PERSISTENTE error %s:%s: %s", ip, port, e, extra={'event': 'a2s_error'})
             return None
-
-# 1. REEMPLAZAR LA CLASE RCONManager COMPLETA
-class RCONManager:
-    """Manejador RCON ULTRA ROBUSTO con reintentos ilimitados hasta lograr conexión"""
     
     @staticmethod
-    async def test_rcon_connection_persistent(ip, port, password, max_attempts=None):
-        """
-        Prueba la conexión RCON con PERSISTENCIA TOTAL
-        max_attempts=None significa intentos ilimitados hasta lograr conexión
-        Returns: {'success': bool, 'error': str, 'response': str, 'attempts': int, 'total_time': float}
-        """
-        last_error = None
-        attempt = 0
-        start_time = time.time()
-        
-        # Timeouts progresivos más agresivos: 10s, 15s, 20s, 25s, luego 30s fijo
-        base_timeouts = [10, 15, 20, 25, 30]
-        
-        logger.info(f"🔌 CONEXIÓN PERSISTENTE iniciada para {ip}:{port} (intentos {'ilimitados' if max_attempts is None else max_attempts})")
-        
-        while max_attempts is None or attempt < max_attempts:
-            attempt += 1
-            
-            # Timeout progresivo
-            if attempt <= len(base_timeouts):
-                timeout = base_timeouts[attempt - 1]
-            else:
-                timeout = 30  # Timeout fijo después del 5to intento
-            
-            try:
-                logger.info(f"🔄 Intento {attempt} - RCON {ip}:{port} (timeout: {timeout}s)")
-                
-                # Usar timeout progresivo más generoso
-                with Client(ip, port, passwd=password, timeout=timeout) as client:
-                    # Comando de prueba confiable
-                    response = client.run('echo "RCON_PERSISTENT_TEST"')
-                    
-                    if response and 'RCON_PERSISTENT_TEST' in response:
-                        total_time = time.time() - start_time
-                        logger.info(f"✅ RCON {ip}:{port} - CONECTADO en intento {attempt} ({total_time:.2f}s total)")
-                        return {
-                            'success': True,
-                            'error': None,
-                            'response': response.strip(),
-                            'attempts': attempt,
-                            'total_time': total_time
-                        }
-                    else:
-                        last_error = f"Respuesta inesperada: {response}"
-                        logger.warning(f"🔶 RCON {ip}:{port} - {last_error}")
-                        
-            except Exception as e:
-                last_error = str(e)
-                logger.warning(f"⚠️ RCON {ip}:{port} intento {attempt} falló: {e}")
+    def parse_info_response(data):
+        """Parsea un datagrama de respuesta A2S_INFO. Returns: dict o None si está incompleto"""
+        if len(data) < 25:
+            return None
             
-            # Espera progresiva entre intentos (más tiempo en intentos posteriores)
-            if attempt <= 3:
-                wait_time = 2  # 2 segundos primeros 3 intentos
-            elif attempt <= 8:
-                wait_time = 5  # 5 segundos siguientes 5 intentos
-            elif attempt <= 15:
-                wait_time = 10  # 10 segundos siguientes 7 intentos
-            else:
-                wait_time = 15  # 15 segundos para intentos posteriores
+        offset = 6  # Skip header and protocol
             
-            if max_attempts is None or attempt < max_attempts:
-                logger.info(f"⏳ Esperando {wait_time}s antes del siguiente intento...")
-                await asyncio.sleep(wait_time)
+        # Server name
+        name_end = data.find(b'\x00', offset)
+        if name_end == -1: return None
+        server_name = data[offset:name_end].decode('utf-8', errors='ignore')
+        offset = name_end + 1
         
-        total_time = time.time() - start_time
-        logger.error(f"❌ RCON {ip}:{port} - FALLÓ después de {attempt} intentos ({total_time:.2f}s total)")
-        return {
-            'success': False,
-            'error': f"Falló después de {attempt} intentos ({total_time:.2f}s): {last_error}",
-            'response': None,
-            'attempts': attempt,
-            'total_time': total_time
-        }
-    
-    @staticmethod
-    async def execute_command_persistent(ip, port, password, command, max_attempts=None):
-        """
-        Ejecuta un comando RCON con PERSISTENCIA TOTAL
-        max_attempts=None significa intentos ilimitados hasta lograr ejecución
-        Returns: {'success': bool, 'response': str, 'error': str, 'attempts': int, 'total_time': float}
-        """
-        last_error = None
-        attempt = 0
-        start_time = time.time()
+        # Map name
+        map_end = data.find(b'\x00', offset)
+        if map_end == -1: return None
+        map_name = data[offset:map_end].decode('utf-8', errors='ignore')
+        offset = map_end + 1
         
-        # Timeouts especiales para comandos específicos
-        if 'matchinfo' in command.lower() or 'sv_matchinfojson' in command.lower():
-            base_timeouts = [20, 30, 40, 50, 60]  # Más tiempo para comandos JSON
-        else:
-            base_timeouts = [10, 15, 20, 25, 30]
+        # Skip folder and game
+        for _ in range(2):
+            end = data.find(b'\x00', offset)
+            if end == -1: return None
+            offset = end + 1
         
-        logger.info(f"🔄 COMANDO PERSISTENTE '{command}' en {ip}:{port} (intentos {'ilimitados' if max_attempts is None else max_attempts})")
+        # Skip ID (2 bytes)
+        offset += 2
         
-        while max_attempts is None or attempt < max_attempts:
-            attempt += 1
-            
-            # Timeout progresivo
-            if attempt <= len(base_timeouts):
-                timeout = base_timeouts[attempt - 1]
-            else:
-                timeout = base_timeouts[-1]  # Usar el timeout más alto
-            
-            try:
-                logger.info(f"🔄 Ejecutando '{command}' intento {attempt} (timeout: {timeout}s)")
-                
-                with Client(ip, port, passwd=password, timeout=timeout) as client:
-                    response = client.run(command)
-                    
-                    if response is not None and len(response.strip()) > 0:
-                        total_time = time.time() - start_time
-                        logger.info(f"✅ Comando '{command}' EXITOSO en intento {attempt}: {len(response)} chars ({total_time:.2f}s)")
-                        return {
-                            'success': True,
-                            'response': response.strip(),
-                            'error': None,
-                            'attempts': attempt,
-                            'total_time': total_time
-                        }
-                    else:
-                        last_error = 'Sin respuesta del servidor'
-                        logger.warning(f"⚠️ '{command}' sin respuesta en intento {attempt}")
-                        
-            except Exception as e:
-                last_error = str(e)
-                logger.warning(f"⚠️ '{command}' falló intento {attempt}: {e}")
-            
-            # Espera progresiva entre intentos
-            if attempt <= 3:
-                wait_time = 3
-            elif attempt <= 8:
-                wait_time = 8
-            elif attempt <= 15:
-                wait_time = 15
-            else:
-                wait_time = 20
-            
-            if max_attempts is None or attempt < max_attempts:
-                logger.info(f"⏳ Esperando {wait_time}s antes del siguiente intento del comando...")
-                await asyncio.sleep(wait_time)
+        # Players and max_players
+        if offset + 1 >= len(data): return None
+        players = data[offset]
+        max_players = data[offset + 1]
         
-        total_time = time.time() - start_time
-        logger.error(f"❌ Comando '{command}' FALLÓ después de {attempt} intentos ({total_time:.2f}s)")
         return {
-            'success': False,
-            'response': '',
-            'error': f"Falló después de {attempt} intentos ({total_time:.2f}s): {last_error}",
-            'attempts': attempt,
-            'total_time': total_time
+            'server_name': server_name,
+            'map_name': map_name,
+            'players': players,
+            'max_players': max_players
         }
     
     @staticmethod
-    async def find_working_rcon_port_persistent(server, password):
+    def query_rules(ip, port, timeout=None):
         """
-        Encuentra el puerto RCON funcional de forma ULTRA PERSISTENTE
+        Consulta A2S_RULES (challenge + reglas). Returns: dict de cvars o None.
+        Las respuestas divididas en varios paquetes no se reensamblan: se devuelve None.
+        """
+        if timeout is None:
+            timeout = get_server_health(ip, port, 'a2s').timeout()
+        
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.settimeout(timeout)
+            try:
+                challenge = b'\xFF\xFF\xFF\xFF'
+                for _ in range(2):
+                    sock.sendto(b'\xFF\xFF\xFF\xFF\x56' + challenge, (ip, port))
+                    data, _ = sock.recvfrom(4096)
+                    if data[:5] == b'\xFF\xFF\xFF\xFF\x41' and len(data) >= 9:
+                        challenge = data[5:9]
+                        continue
+                    break
+            finally:
+                sock.close()
+            return A2SQuery.parse_rules_response(data)
+        except Exception as e:
+            server_logger(f"{ip}:{port}").warning("⚠️ A2S_RULES error %s:%s: %s", ip, port, e, extra={'event': 'a2s_error'})
+            return None
+    
+    @staticmethod
+    def parse_rules_response(data):
+        if data[:5] != b'\xFF\xFF\xFF\xFF\x45' or len(data) < 7:
+            return None
+        count = struct.unpack_from('<H', data, 5)[0]
+        rules = {}
+        offset = 7
+        for _ in range(count):
+            name_end = data.find(b'\x00', offset)
+            if name_end == -1:
+                break
+            value_end = data.find(b'\x00', name_end + 1)
+            if value_end == -1:
+                break
+            rules[data[offset:name_end].decode('utf-8', errors='ignore')] = \
+                data[name_end + 1:value_end].decode('utf-8', errors='ignore')
+            offset = value_end + 1
+        return rules
+
+# ============= CLIENTE RCON NATIVO (MULTI-PAQUETE) =============
+RCON_RECV_CHUNK = 8192          # Tamaño del buffer reutilizable de lectura
+RCON_MAX_PACKET_SIZE = 65536    # Límite defensivo para un paquete individual
+
+class SourceRCONClient:
+    """
+    Cliente Source RCON con reensamblado de respuestas multi-paquete.
+    Tras cada comando envía un SERVERDATA_RESPONSE_VALUE vacío como centinela:
+    el servidor lo devuelve después del último fragmento de la respuesta, así que
+    sabemos exactamente cuándo terminó sin esperar a que venza el timeout.
+    Misma interfaz que rcon.Client: `with SourceRCONClient(...) as c: c.run(cmd)`
+    """
+    SERVERDATA_AUTH = 3
+    SERVERDATA_AUTH_RESPONSE = 2
+    SERVERDATA_EXECCOMMAND = 2
+    SERVERDATA_RESPONSE_VALUE = 0
+
+    def __init__(self, ip, port, passwd=None, timeout=10):
+        self.ip = ip
+        self.port = port
+        self.passwd = passwd
+        self.timeout = timeout
+        self.sock = None
+        self.aborted = False
+        self.last_used = time.monotonic()
+        self._last_id = 0
+        self._recv_buffer = bytearray(RCON_RECV_CHUNK)
+        self._pending = bytearray()  # Bytes recibidos todavía sin consumir
+
+    def __enter__(self):
+        self.connect()
+        if self.passwd is not None:
+            self.login(self.passwd)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def connect(self):
+        self.sock = socket.create_connection((self.ip, self.port), timeout=self.timeout)
+
+    def abort(self):
+        """Corta la sesión desde otro hilo (despierta un recv bloqueado)"""
+        self.aborted = True
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.close()
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+        self._pending.clear()
+
+    def _new_id(self):
+        self._last_id = self._last_id % 0x7FFFFFF0 + 1
+        return self._last_id
+
+    @staticmethod
+    def _encode_packet(request_id, packet_type, body=b''):
+        payload = struct.pack('<ii', request_id, packet_type) + body + b'\x00\x00'
+        return struct.pack('<i', len(payload)) + payload
+
+    def _send_packet(self, request_id, packet_type, body=b''):
+        self.sock.sendall(self._encode_packet(request_id, packet_type, body))
+
+    def _fill(self, needed):
+        """Lee del socket hasta tener al menos `needed` bytes pendientes"""
+        view = memoryview(self._recv_buffer)
+        try:
+            while len(self._pending) < needed:
+                received = self.sock.recv_into(view)
+                if received == 0:
+                    raise ConnectionError("RCON: conexión cerrada por el servidor")
+                self._pending += view[:received]
+        finally:
+            view.release()
+
+    def _read_packet(self, collect_id=None, sink=None):
+        """
+        Lee un paquete completo. Si su id coincide con `collect_id`, el cuerpo se
+        copia directamente a `sink` (bytearray) sin crear strings intermedios.
+        Returns: (request_id, packet_type)
+        """
+        self._fill(4)
+        size = struct.unpack_from('<i', self._pending, 0)[0]
+        if size < 10 or size > RCON_MAX_PACKET_SIZE:
+            raise ConnectionError(f"RCON: tamaño de paquete inválido ({size})")
+
+        self._fill(4 + size)
+        request_id, packet_type = struct.unpack_from('<ii', self._pending, 4)
+
+        if sink is not None and request_id == collect_id:
+            with memoryview(self._pending) as view:
+                body = view[12:4 + size - 2]  # Sin los dos terminadores nulos
+                sink += body
+                body.release()
+
+        del self._pending[:4 + size]
+        return request_id, packet_type
+
+    def login(self, passwd):
+        with tracer.span('rcon_auth', track=f"rcon {self.ip}:{self.port}"):
+            return self._login(passwd)
+
+    def _login(self, passwd):
+        auth_id = self._new_id()
+        self._send_packet(auth_id, self.SERVERDATA_AUTH, passwd.encode('utf-8'))
+
+        # El servidor manda un RESPONSE_VALUE vacío antes del AUTH_RESPONSE
+        while True:
+            request_id, packet_type = self._read_packet()
+            if packet_type == self.SERVERDATA_AUTH_RESPONSE:
+                if request_id == -1:
+                    raise ConnectionError("RCON: contraseña incorrecta")
+                return True
+
+    def run(self, command):
+        """Ejecuta un comando y devuelve la respuesta completa reensamblada"""
+        command_id = self._new_id()
+        sentinel_id = self._new_id()
+
+        # Comando + centinela en un solo envío (evita la espera de Nagle entre ambos)
+        self.sock.sendall(
+            self._encode_packet(command_id, self.SERVERDATA_EXECCOMMAND, command.encode('utf-8')) +
+            self._encode_packet(sentinel_id, self.SERVERDATA_RESPONSE_VALUE)
+        )
+
+        response = bytearray()
+        fragments = 0
+        while True:
+            request_id, _ = self._read_packet(collect_id=command_id, sink=response)
+            if request_id == sentinel_id:
+                # Centinela recibido: todos los fragmentos anteriores ya llegaron.
+                # Los paquetes sobrantes del centinela se descartan por id en la próxima lectura.
+                break
+            if request_id == command_id:
+                fragments += 1
+
+        if fragments > 1:
+            logger.debug("🧩 RCON %s:%s '%s' reensamblado de %d paquetes (%d bytes)", self.ip, self.port, command,
+                         fragments, len(response), extra={'event': 'rcon_reassembly'})
+
+        return response.decode('utf-8', errors='replace')
+
+# ============= POOL DE SESIONES RCON Y HEDGING =============
+RCON_POOL_SIZE = int(os.getenv('RCON_POOL_SIZE', '2'))              # Sesiones inactivas por servidor
+RCON_HEDGING = os.getenv('RCON_HEDGING', '0').lower() in ('1', 'true', 'yes')
+RCON_HEDGE_BUDGET = float(os.getenv('RCON_HEDGE_BUDGET', '0.1'))    # Hedges por request (10%)
+RCON_HEDGE_MAX_TOKENS = 2.0                                         # Ráfaga máxima de hedges por host
+RCON_KEEPALIVE_IDLE = float(os.getenv('RCON_KEEPALIVE_IDLE', '240'))  # Ping a sesiones inactivas hace más de esto (justo bajo el corte de NAT/servidor)
+RCON_KEEPALIVE_COMMAND = os.getenv('RCON_KEEPALIVE_COMMAND', 'echo keepalive')
+RCON_WARM_SESSIONS = int(os.getenv('RCON_WARM_SESSIONS', '1'))      # Sesiones pre-abiertas por servidor
+
+class RCONSessionPool:
+    """
+    Sesiones RCON ya autenticadas, reutilizables por (ip, port) con la misma contraseña. Seguro entre hilos.
+    Una sesión autenticada con otra contraseña (o de un host desalojado) se cierra en vez de reutilizarse.
+    """
+
+    def __init__(self, max_idle=RCON_POOL_SIZE):
+        self.max_idle = max_idle
+        self._idle = {}  # (ip, port) -> [SourceRCONClient]
+        self._lock = threading.Lock()
+        self.known_hosts = {}  # (ip, port) -> contraseña, para recalentar tras una reconexión
+        self.keepalives = 0
+        self.keepalive_failures = 0
+        self.warmed = 0
+
+    def acquire(self, ip, port, password, timeout):
+        """Devuelve (cliente, reutilizado). Abre y autentica una sesión nueva si no hay libres."""
+        stale = []
+        reused = None
+        with self._lock:
+            sessions = self._idle.get((ip, port), [])
+            while sessions:
+                client = sessions.pop()
+                if client.sock is None:
+                    continue
+                if client.passwd != password:
+                    stale.append(client)  # La contraseña cambió: esa sesión ya no corresponde
+                    continue
+                reused = client
+                break
+        for client in stale:
+            client.close()
+        if reused is not None:
+            reused.timeout = timeout
+            reused.sock.settimeout(timeout)
+            return reused, True
+        
+        client = SourceRCONClient(ip, port, passwd=password, timeout=timeout)
+        try:
+            client.connect()
+            client.login(password)
+        except Exception:
+            client.close()
+            raise
+        with self._lock:
+            self.known_hosts[(ip, port)] = password
+        return client, False
+
+    def release(self, client):
+        if client.sock is None:
+            return  # Sesión abortada o cerrada
+        client.last_used = time.monotonic()
+        with self._lock:
+            # Solo vuelve al pool si el host sigue registrado con la misma contraseña (ver evict)
+            if self.known_hosts.get((client.ip, client.port)) == client.passwd:
+                sessions = self._idle.setdefault((client.ip, client.port), [])
+                if len(sessions) < self.max_idle:
+                    sessions.append(client)
+                    return
+        client.close()
+
+    def evict(self, ip, port):
+        """
+        Cierra las sesiones libres de (ip, port) y olvida su contraseña: el keepalive deja de
+        recalentarlo y las sesiones en uso se cierran al devolverse. Returns: sesiones cerradas
+        """
+        with self._lock:
+            sessions = self._idle.pop((ip, port), [])
+            self.known_hosts.pop((ip, port), None)
+        for client in sessions:
+            client.close()
+        return len(sessions)
+
+    def idle_count(self, ip, port):
+        with self._lock:
+            return len(self._idle.get((ip, port), []))
+
+    def take_idle_since(self, max_idle_seconds):
+        """Saca del pool las sesiones sin uso hace más de `max_idle_seconds` (quedan en manos del llamador)"""
+        cutoff = time.monotonic() - max_idle_seconds
+        due = []
+        with self._lock:
+            for sessions in self._idle.values():
+                keep = [client for client in sessions if client.last_used > cutoff]
+                due.extend(client for client in sessions if client.last_used <= cutoff)
+                sessions[:] = keep
+        return due
+
+    def keepalive(self, client):
+        """Comando trivial sobre una sesión inactiva (bloqueante). Returns: True si sigue viva"""
+        timeout = get_server_health(client.ip, client.port, 'rcon').timeout()
+        try:
+            client.timeout = timeout
+            client.sock.settimeout(timeout)
+            client.run(RCON_KEEPALIVE_COMMAND)
+        except Exception:
+            client.close()
+            with self._lock:
+                self.keepalive_failures += 1
+            return False
+        with self._lock:
+            self.keepalives += 1
+        self.release(client)
+        return True
+
+    def warm(self, ip, port, password, count=RCON_WARM_SESSIONS):
+        """Abre y autentica sesiones hasta tener `count` libres (bloqueante). Returns: sesiones abiertas"""
+        opened = 0
+        timeout = get_server_health(ip, port, 'rcon').timeout()
+        while self.idle_count(ip, port) < min(count, self.max_idle):
+            client = SourceRCONClient(ip, port, passwd=password, timeout=timeout)
+            try:
+                with tracer.span('rcon_warmup', track=f"rcon {ip}:{port}"):
+                    client.connect()
+                    client.login(password)
+            except Exception:
+                client.close()
+                raise
+            with self._lock:
+                self.known_hosts[(ip, port)] = password
+            self.release(client)
+            opened += 1
+        with self._lock:
+            self.warmed += opened
+        return opened
+
+    def describe(self):
+        with self._lock:
+            idle = sum(len(sessions) for sessions in self._idle.values())
+        return (f"{idle} sesiones libres, {self.warmed} precalentadas, "
+                f"{self.keepalives} keepalives, {self.keepalive_failures} caídas detectadas")
+
+rcon_pool = RCONSessionPool()
+
+async def warm_rcon_sessions(ip, port, password):
+    try:
+        opened = await asyncio.to_thread(rcon_pool.warm, ip, port, password)
+        if opened:
+            server_logger(f"{ip}:{port}").info("🔥 %d sesión(es) RCON precalentada(s) en %s:%s", opened, ip, port)
+    except Exception as e:
+        server_logger(f"{ip}:{port}").warning("⚠️ No se pudo precalentar RCON %s:%s: %s", ip, port, e)
+
+async def rcon_keepalive_loop():
+    """Mantiene vivas las sesiones del pool; las que cayeron se reemplazan por una sesión nueva"""
+    while True:
+        await asyncio.sleep(RCON_KEEPALIVE_IDLE / 8)
+        try:
+            for client in rcon_pool.take_idle_since(RCON_KEEPALIVE_IDLE):
+                alive = await asyncio.to_thread(rcon_pool.keepalive, client)
+                password = rcon_pool.known_hosts.get((client.ip, client.port))
+                if not alive and password is not None:
+                    server_logger(f"{client.ip}:{client.port}").info(
+                        "💤 Sesión RCON inactiva caída en %s:%s, reconectando", client.ip, client.port)
+                    await warm_rcon_sessions(client.ip, client.port, password)
+        except Exception as e:
+            logger.error("❌ Error en keepalive RCON: %s", e)
+
+rcon_keepalive_task = None
+
+def start_rcon_keepalive():
+    global rcon_keepalive_task
+    if RCON_KEEPALIVE_IDLE > 0 and (rcon_keepalive_task is None or rcon_keepalive_task.done()):
+        rcon_keepalive_task = asyncio.create_task(rcon_keepalive_loop())
+
+class HedgeBudget:
+    """Presupuesto de hedges por host: cada request suma RCON_HEDGE_BUDGET tokens, cada hedge gasta 1"""
+
+    def __init__(self, ratio=RCON_HEDGE_BUDGET, max_tokens=RCON_HEDGE_MAX_TOKENS):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = {}  # (ip, port) -> tokens disponibles
+
+    def on_request(self, host):
+        self._tokens[host] = min(self.max_tokens, self._tokens.get(host, 0.0) + self.ratio)
+
+    def try_spend(self, host):
+        if self._tokens.get(host, 0.0) >= 1.0:
+            self._tokens[host] -= 1.0
+            return True
+        return False
+
+    def forget(self, host):
+        self._tokens.pop(host, None)
+
+rcon_hedge_budget = HedgeBudget()
+
+def track_rcon_session(client, sessions, cancelled):
+    """
+    Registra la sesión para que un hedge perdido pueda abortarla. Si la petición ya se
+    canceló mientras se abría la sesión, el abort no la vio: se cierra acá.
+    """
+    sessions.append(client)
+    if cancelled is not None and cancelled.is_set():
+        client.abort()
+        raise ConnectionError("RCON: petición cancelada (hedge perdido)")
+
+def run_pooled_rcon_command(ip, port, password, command, timeout, sessions, cancelled=None):
+    """
+    Ejecuta `command` sobre una sesión del pool (bloqueante, se llama desde un hilo).
+    La sesión en uso se agrega a `sessions` para poder abortarla si pierde un hedge;
+    `cancelled` (threading.Event) marca que ya se abortó.
+    """
+    client, reused = rcon_pool.acquire(ip, port, password, timeout)
+    track_rcon_session(client, sessions, cancelled)
+    try:
+        response = client.run(command)
+    except (OSError, ConnectionError):
+        client.close()
+        if not reused or client.aborted or (cancelled is not None and cancelled.is_set()):
+            raise
+        # Una sesión reutilizada puede haber sido cerrada por el servidor: un reintento con sesión nueva
+        client, _ = rcon_pool.acquire(ip, port, password, timeout)
+        track_rcon_session(client, sessions, cancelled)
+        try:
+            response = client.run(command)
+        except Exception:
+            client.close()
+            raise
+    except Exception:
+        client.close()
+        raise
+    rcon_pool.release(client)
+    return response
+
+async def run_rcon_command(ip, port, password, command, timeout):
+    """
+    Ejecuta un comando RCON sin bloquear el event loop.
+    Con RCON_HEDGING activo, si sv_matchinfojson no respondió en el p95 observado se lanza
+    una segunda petición por otra sesión del pool: gana la primera respuesta y la otra se aborta.
+    """
+    host = (ip, port)
+    kind = rcon_command_kind(command)
+    health = get_server_health(ip, port, kind)
+    attempts = []  # [(task, sessions, cancelled)]
+    
+    def launch():
+        sessions = []
+        cancelled = threading.Event()
+        task = asyncio.create_task(asyncio.to_thread(
+            run_pooled_rcon_command, ip, port, password, command, timeout, sessions, cancelled
+        ))
+        attempts.append((task, sessions, cancelled))
+        return task
+    
+    primary = launch()
+    hedge_enabled = RCON_HEDGING and kind == 'matchinfo' and health.samples >= HEALTH_MIN_SAMPLES
+    if not hedge_enabled:
+        return await primary
+    
+    rcon_hedge_budget.on_request(host)
+    hedge_delay = health.percentile(HEALTH_P95_Z)
+    done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+    if done:
+        return primary.result()
+    
+    if not rcon_hedge_budget.try_spend(host):
+        return await primary
+    
+    logger.info("🪝 Hedge RCON %s:%s '%s': sin respuesta tras %.2fs (p95), segunda petición", ip, port, command,
+                hedge_delay, extra={'event': 'rcon_hedge'})
+    launch()
+    
+    pending = {task for task, _, _ in attempts}
+    last_error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+        raise last_error
+    finally:
+        # Abortar las peticiones perdedoras para liberar sus conexiones
+        for task, sessions, cancelled in attempts:
+            if not task.done():
+                task.cancel()
+                cancelled.set()  # Antes de recorrer: una sesión que se abra después se cierra sola
+                for client in list(sessions):
+                    client.abort()
+
+# ============= SINGLE-FLIGHT (AGRUPAR CONSULTAS CONCURRENTES) =============
+SINGLE_FLIGHT_SHARE_WINDOW = float(os.getenv('SINGLE_FLIGHT_SHARE_WINDOW', '5'))  # Segundos
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+    Los que llegan mientras está en curso esperan el mismo futuro; con `share=True`
+    el resultado se sigue compartiendo durante `share_window` segundos después de
+    terminar y se descarta al vencer (no usar con resultados grandes como el JSON crudo).
+    """
+
+    def __init__(self, share_window=SINGLE_FLIGHT_SHARE_WINDOW):
+        self.share_window = share_window
+        self._in_flight = {}  # clave -> asyncio.Task
+        self._recent = {}     # clave -> (terminado_en, resultado), solo dentro de la ventana
+
+    async def run(self, key, coro_factory, share=True):
+        recent = self._recent.get(key)
+        if recent:
+            if time.monotonic() - recent[0] < self.share_window:
+                return recent[1]
+            self._recent.pop(key, None)
+        
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done, share))
+        else:
+            logger.info("🔗 Single-flight: reutilizando consulta en curso %s", key, extra={'event': 'single_flight_reuse'})
+        
+        # shield: si un llamador se cancela, los demás siguen esperando el resultado
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task, share):
+        self._in_flight.pop(key, None)
+        if share and self.share_window > 0 and not task.cancelled() and task.exception() is None:
+            entry = (time.monotonic(), task.result())
+            self._recent[key] = entry
+            task.get_loop().call_later(self.share_window, self._expire, key, entry)
+
+    def _expire(self, key, entry):
+        if self._recent.get(key) is entry:
+            del self._recent[key]
+
+rcon_single_flight = SingleFlight()
+
+# 1. REEMPLAZAR LA CLASE RCONManager COMPLETA
+class RCONManager:
+    """Manejador RCON ULTRA ROBUSTO con reintentos ilimitados hasta lograr conexión"""
+    
+    @staticmethod
+    async def test_rcon_connection_persistent(ip, port, password, max_attempts=None):
+        """
+        Prueba la conexión RCON con PERSISTENCIA TOTAL
+        max_attempts=None significa intentos ilimitados hasta lograr conexión
+        Returns: {'success': bool, 'error': str, 'response': str, 'attempts': int, 'total_time': float}
+        """
+        last_error = None
+        attempt = 0
+        start_time = time.time()
+        
+        # Timeouts adaptativos según la latencia observada del servidor
+        health = get_server_health(ip, port, 'rcon')
+        log = server_logger(f"{ip}:{port}")
+        
+        log.info("🔌 CONEXIÓN PERSISTENTE iniciada para %s:%s (intentos %s)", ip, port,
+                 'ilimitados' if max_attempts is None else max_attempts)
+        
+        while max_attempts is None or attempt < max_attempts:
+            attempt += 1
+            
+            # Timeout progresivo a partir del p99 observado
+            timeout = health.timeout(attempt)
+            
+            try:
+                log.info("🔄 Intento %d - RCON %s:%s (timeout: %ss)", attempt, ip, port, timeout,
+                         extra={'event': 'rcon_attempt'})
+                
+                attempt_start = time.monotonic()
+                with tracer.span('echo_probe', track=f"rcon {ip}:{port}", attempt=attempt):
+                    # Comando de prueba confiable, por una sesión del pool (sin handshake si hay una abierta)
+                    response = await run_rcon_command(ip, port, password, 'echo "RCON_PERSISTENT_TEST"', timeout)
+                    
+                    if response and 'RCON_PERSISTENT_TEST' in response:
+                        health.record_success(time.monotonic() - attempt_start)
+                        total_time = time.time() - start_time
+                        log.info("✅ RCON %s:%s - CONECTADO en intento %d (%.2fs total)", ip, port, attempt, total_time)
+                        return {
+                            'success': True,
+                            'error': None,
+                            'response': response.strip(),
+                            'attempts': attempt,
+                            'total_time': total_time
+                        }
+                    else:
+                        last_error = f"Respuesta inesperada: {response}"
+                        log.warning("🔶 RCON %s:%s - %s", ip, port, last_error)
+                        
+            except Exception as e:
+                last_error = str(e)
+                health.record_failure()
+                log.warning("⚠️ RCON %s:%s intento %d falló: %s", ip, port, attempt, e, extra={'event': 'rcon_failure'})
+            
+            # Espera progresiva entre intentos (más tiempo en intentos posteriores)
+            if attempt <= 3:
+                wait_time = 2  # 2 segundos primeros 3 intentos
+            elif attempt <= 8:
+                wait_time = 5  # 5 segundos siguientes 5 intentos
+            elif attempt <= 15:
+                wait_time = 10  # 10 segundos siguientes 7 intentos
+            else:
+                wait_time = 15  # 15 segundos para intentos posteriores
+            
+            if max_attempts is None or attempt < max_attempts:
+                log.info("⏳ Esperando %ss antes del siguiente intento...", wait_time, extra={'event': 'rcon_wait'})
+                await asyncio.sleep(wait_time)
+        
+        total_time = time.time() - start_time
+        log.error("❌ RCON %s:%s - FALLÓ después de %d intentos (%.2fs total)", ip, port, attempt, total_time)
+        return {
+            'success': False,
+            'error': f"Falló después de {attempt} intentos ({total_time:.2f}s): {last_error}",
+            'response': None,
+            'attempts': attempt,
+            'total_time': total_time
+        }
+    
+    @staticmethod
+    async def execute_command_persistent(ip, port, password, command, max_attempts=None):
+        """
+        Ejecuta un comando RCON con PERSISTENCIA TOTAL
+        max_attempts=None significa intentos ilimitados hasta lograr ejecución
+        Returns: {'success': bool, 'response': str, 'error': str, 'attempts': int, 'total_time': float}
+        """
+        last_error = None
+        attempt = 0
+        start_time = time.time()
+        
+        # Timeouts adaptativos (los comandos JSON tienen su propio historial de latencia)
+        health = get_server_health(ip, port, rcon_command_kind(command))
+        log = server_logger(f"{ip}:{port}")
+        
+        log.info("🔄 COMANDO PERSISTENTE '%s' en %s:%s (intentos %s)", command, ip, port,
+                 'ilimitados' if max_attempts is None else max_attempts)
+        
+        while max_attempts is None or attempt < max_attempts:
+            attempt += 1
+            
+            # Timeout progresivo a partir del p99 observado
+            timeout = health.timeout(attempt)
+            
+            try:
+                log.info("🔄 Ejecutando '%s' intento %d (timeout: %ss)", command, attempt, timeout,
+                         extra={'event': 'rcon_attempt'})
+                
+                attempt_start = time.monotonic()
+                with tracer.span(command, track=f"rcon {ip}:{port}", attempt=attempt, timeout=timeout):
+                    response = await run_rcon_command(ip, port, password, command, timeout)
+                
+                if response is not None and len(response.strip()) > 0:
+                    health.record_success(time.monotonic() - attempt_start)
+                    traffic_recorder.record('rcon', f"{ip}:{port}", response, command=command)
+                    total_time = time.time() - start_time
+                    log.info("✅ Comando '%s' EXITOSO en intento %d: %d chars (%.2fs)", command, attempt,
+                             len(response), total_time, extra={'event': 'rcon_ok'})
+                    return {
+                        'success': True,
+                        'response': response.strip(),
+                        'error': None,
+                        'attempts': attempt,
+                        'total_time': total_time
+                    }
+                else:
+                    last_error = 'Sin respuesta del servidor'
+                    log.warning("⚠️ '%s' sin respuesta en intento %d", command, attempt, extra={'event': 'rcon_failure'})
+                    
+            except Exception as e:
+                last_error = str(e)
+                health.record_failure()
+                log.warning("⚠️ '%s' falló intento %d: %s", command, attempt, e, extra={'event': 'rcon_failure'})
+            
+            # Espera progresiva entre intentos
+            if attempt <= 3:
+                wait_time = 3
+            elif attempt <= 8:
+                wait_time = 8
+            elif attempt <= 15:
+                wait_time = 15
+            else:
+                wait_time = 20
+            
+            if max_attempts is None or attempt < max_attempts:
+                log.info("⏳ Esperando %ss antes del siguiente intento del comando...", wait_time,
+                         extra={'event': 'rcon_wait'})
+                await asyncio.sleep(wait_time)
+        
+        total_time = time.time() - start_time
+        log.error("❌ Comando '%s' FALLÓ después de %d intentos (%.2fs)", command, attempt, total_time)
+        return {
+            'success': False,
+            'response': '',
+            'error': f"Falló después de {attempt} intentos ({total_time:.2f}s): {last_error}",
+            'attempts': attempt,
+            'total_time': total_time
+        }
+    
+    @staticmethod
+    async def find_working_rcon_port_persistent(server, password):
+        """
+        Encuentra el puerto RCON funcional de forma ULTRA PERSISTENTE
         Prueba cada puerto hasta que alguno funcione, sin límite de tiempo
         Returns: {'port': int, 'success': bool, 'error': str, 'attempts_per_port': dict, 'total_time': float}
         """
-        logger.info(f"🔍 BÚSQUEDA PERSISTENTE de puerto RCON para {server['name']}")
+        log = server_logger(server.get('id', server['name']))
+        log.info("🔍 BÚSQUEDA PERSISTENTE de puerto RCON para %s", server['name'])
         
         # VALIDACIÓN: Solo usar puertos explícitamente definidos
         allowed_ports = server.get('rcon_ports', [])
@@ -316,7 +1547,7 @@ class RCONManager:
                 'total_time': 0
             }
         
-        logger.info(f"🛡️ Puertos permitidos para {server['name']}: {allowed_ports}")
+        log.info("🛡️ Puertos permitidos para %s: %s", server['name'], allowed_ports)
         
         attempts_log = {}
         start_time = time.time()
@@ -324,7 +1555,7 @@ class RCONManager:
         # ESTRATEGIA: Intentar cada puerto de forma persistente hasta que UNO funcione
         while True:  # Loop infinito hasta encontrar un puerto funcional
             for port in allowed_ports:
-                logger.info(f"🔐 Probando puerto persistente: {port}")
+                log.info("🔐 Probando puerto persistente: %s", port, extra={'event': 'port_probe'})
                 
                 # Intentar este puerto de forma persistente (máximo 10 intentos por puerto por ronda)
                 test_result = await RCONManager.test_rcon_connection_persistent(
@@ -341,7 +1572,8 @@ class RCONManager:
                 
                 if test_result['success']:
                     total_time = time.time() - start_time
-                    logger.info(f"✅ Puerto RCON ENCONTRADO: {port} (total: {total_time:.2f}s, {attempts_log[port]['total_attempts']} intentos)")
+                    log.info("✅ Puerto RCON ENCONTRADO: %s (total: %.2fs, %d intentos)", port, total_time,
+                             attempts_log[port]['total_attempts'], extra={'event': 'port_found'})
                     return {
                         'port': port,
                         'success': True,
@@ -350,10 +1582,11 @@ class RCONManager:
                         'total_time': total_time
                     }
                 else:
-                    logger.warning(f"❌ Puerto {port} falló ronda {attempts_log[port]['rounds']}: {test_result['error']}")
+                    log.warning("❌ Puerto %s falló ronda %d: %s", port, attempts_log[port]['rounds'], test_result['error'],
+                                extra={'event': 'port_failure'})
             
             # Si llegamos aquí, ningún puerto funcionó en esta ronda
-            logger.warning(f"⚠️ Ningún puerto funcionó en esta ronda. Esperando 30s antes de intentar todos de nuevo...")
+            log.warning("⚠️ Ningún puerto funcionó en esta ronda. Esperando 30s antes de intentar todos de nuevo...")
             await asyncio.sleep(30)  # Espera larga antes de reintentar todos los puertos
     
     @staticmethod
@@ -377,7 +1610,8 @@ class RCONManager:
         Prueba cada puerto hasta que alguno funcione, sin límite de tiempo
         Returns: {'port': int, 'success': bool, 'error': str, 'attempts_per_port': dict, 'total_time': float}
         """
-        logger.info(f"🔍 BÚSQUEDA PERSISTENTE de puerto RCON para {server['name']}")
+        log = server_logger(server.get('id', server['name']))
+        log.info("🔍 BÚSQUEDA PERSISTENTE de puerto RCON para %s", server['name'])
         
         # VALIDACIÓN: Solo usar puertos explícitamente definidos
         allowed_ports = server.get('rcon_ports', [])
@@ -390,7 +1624,7 @@ class RCONManager:
                 'total_time': 0
             }
         
-        logger.info(f"🛡️ Puertos permitidos para {server['name']}: {allowed_ports}")
+        log.info("🛡️ Puertos permitidos para %s: %s", server['name'], allowed_ports)
         
         attempts_log = {}
         start_time = time.time()
@@ -398,7 +1632,7 @@ class RCONManager:
         # ESTRATEGIA: Intentar cada puerto de forma persistente hasta que UNO funcione
         while True:  # Loop infinito hasta encontrar un puerto funcional
             for port in allowed_ports:
-                logger.info(f"🔐 Probando puerto persistente: {port}")
+                log.info("🔐 Probando puerto persistente: %s", port, extra={'event': 'port_probe'})
                 
                 # Intentar este puerto de forma persistente (máximo 10 intentos por puerto por ronda)
                 test_result = await RCONManager.test_rcon_connection_persistent(
@@ -415,7 +1649,8 @@ class RCONManager:
                 
                 if test_result['success']:
                     total_time = time.time() - start_time
-                    logger.info(f"✅ Puerto RCON ENCONTRADO: {port} (total: {total_time:.2f}s, {attempts_log[port]['total_attempts']} intentos)")
+                    log.info("✅ Puerto RCON ENCONTRADO: %s (total: %.2fs, %d intentos)", port, total_time,
+                             attempts_log[port]['total_attempts'], extra={'event': 'port_found'})
                     return {
                         'port': port,
                         'success': True,
@@ -424,24 +1659,39 @@ class RCONManager:
                         'total_time': total_time
                     }
                 else:
-                    logger.warning(f"❌ Puerto {port} falló ronda {attempts_log[port]['rounds']}: {test_result['error']}")
+                    log.warning("❌ Puerto %s falló ronda %d: %s", port, attempts_log[port]['rounds'], test_result['error'],
+                                extra={'event': 'port_failure'})
             
             # Si llegamos aquí, ningún puerto funcionó en esta ronda
-            logger.warning(f"⚠️ Ningún puerto funcionó en esta ronda. Esperando 30s antes de intentar todos de nuevo...")
+            log.warning("⚠️ Ningún puerto funcionó en esta ronda. Esperando 30s antes de intentar todos de nuevo...")
             await asyncio.sleep(30)  # Espera larga antes de reintentar todos los puertos
     
     @staticmethod
     async def get_match_info_json_persistent(server, password):
         """
         Obtiene información del partido de forma ULTRA PERSISTENTE
-        No se rinde hasta conseguir la información
+        Llamadas concurrentes al mismo servidor comparten una sola ejecución de sv_matchinfojson
+        (el resultado crudo no se retiene al terminar; la ventana se aplica al match info proyectado)
         Returns: {'success': bool, 'data': dict, 'working_port': int, 'error': str, 'connection_info': dict, 'total_time': float}
         """
-        logger.info(f"🎮 Obteniendo match info JSON PERSISTENTE para {server['name']}")
+        key = (server.get('id', server['name']), 'sv_matchinfojson')
+        return await rcon_single_flight.run(
+            key, lambda: RCONManager.fetch_match_info_json_persistent(server, password), share=False
+        )
+    
+    @staticmethod
+    async def fetch_match_info_json_persistent(server, password):
+        """
+        Obtiene información del partido de forma ULTRA PERSISTENTE (sin agrupar)
+        No se rinde hasta conseguir la información
+        """
+        log = server_logger(server.get('id', server['name']))
+        log.info("🎮 Obteniendo match info JSON PERSISTENTE para %s", server['name'])
         start_time = time.time()
         
         # 1. Encontrar puerto funcional de forma persistente
-        port_result = await RCONManager.find_working_rcon_port_persistent(server, password)
+        with tracer.span('port_discovery', track=server.get('id', server['name'])):
+            port_result = await RCONManager.find_working_rcon_port_persistent(server, password)
         
         if not port_result['success']:
             return {
@@ -454,7 +1704,7 @@ class RCONManager:
             }
         
         working_port = port_result['port']
-        logger.info(f"🔐 Usando puerto persistente {working_port} para match info")
+        log.info("🔐 Usando puerto persistente %s para match info", working_port)
         
         # 2. Ejecutar sv_matchinfojson de forma persistente (sin límite de intentos)
         result = await RCONManager.execute_command_persistent(
@@ -478,44 +1728,31 @@ class RCONManager:
         # 3. Parsear JSON con manejo de errores mejorado
         try:
             response = result['response'].strip()
-            logger.info(f"📄 Respuesta JSON persistente recibida: {len(response)} caracteres")
+            log.info("📄 Respuesta JSON persistente recibida: %d caracteres", len(response))
             
             # Buscar JSON en la respuesta de forma más robusta
-            json_start = response.find('{')
-            json_end = response.rfind('}')
+            json_text = extract_json_text(response)
             
-            if json_start == -1 or json_end == -1 or json_start >= json_end:
-                # Intentar buscar patrones alternativos
-                lines = response.split('\n')
-                json_line = None
-                for line in lines:
-                    line = line.strip()
-                    if line.startswith('{') and line.endswith('}'):
-                        json_line = line
-                        break
-                
-                if not json_line:
-                    return {
-                        'success': False,
-                        'data': None,
-                        'working_port': working_port,
-                        'error': f'JSON no encontrado en respuesta persistente de {len(response)} caracteres',
-                        'connection_info': {
-                            'raw_response_preview': response[:300] + '...' if len(response) > 300 else response,
-                            'parsing_attempts': 'failed_pattern_search'
-                        },
-                        'total_time': time.time() - start_time
-                    }
-                
-                json_text = json_line
-            else:
-                json_text = response[json_start:json_end+1]
+            if json_text is None:
+                return {
+                    'success': False,
+                    'data': None,
+                    'working_port': working_port,
+                    'error': f'JSON no encontrado en respuesta persistente de {len(response)} caracteres',
+                    'connection_info': {
+                        'raw_response_preview': response[:300] + '...' if len(response) > 300 else response,
+                        'parsing_attempts': 'failed_pattern_search'
+                    },
+                    'total_time': time.time() - start_time
+                }
             
             # Parsear JSON
-            match_data = json.loads(json_text)
+            with tracer.span('json_loads', track=server.get('id', server['name']), size=len(json_text)):
+                match_data = json.loads(json_text)
             
             total_time = time.time() - start_time
-            logger.info(f"✅ JSON PERSISTENTE parseado exitosamente: {len(json_text)} caracteres, {len(match_data)} campos ({total_time:.2f}s total)")
+            log.info("✅ JSON PERSISTENTE parseado exitosamente: %d caracteres, %d campos (%.2fs total)",
+                     len(json_text), len(match_data), total_time)
             
             return {
                 'success': True,
@@ -532,7 +1769,7 @@ class RCONManager:
             }
             
         except json.JSONDecodeError as e:
-            logger.error(f"❌ Error parsing JSON persistente: {e}")
+            log.error("❌ Error parsing JSON persistente: %s", e)
             return {
                 'success': False,
                 'data': None,
@@ -551,29 +1788,196 @@ class RCONManager:
         """
         FUNCIÓN FALTANTE - Alias para compatibilidad
         """
-        return await RCONManager.get_match_info_json_safe(server, password)
+        return await RCONManager.get_match_info_json_persistent(server, password)
 
-def parse_match_info(match_data):
-    """
-    Parsea la información del partido desde el JSON REAL de IOSoccer
-    """
-    if not match_data:
-        logger.warning("⚠️ parse_match_info: match_data es None o vacío")
+def extract_json_text(response):
+    """Extrae el texto JSON de una respuesta RCON. Returns: str o None si no hay JSON"""
+    json_start = response.find('{')
+    json_end = response.rfind('}')
+    
+    if json_start == -1 or json_end == -1 or json_start >= json_end:
+        # Intentar buscar patrones alternativos
+        for line in response.split('\n'):
+            line = line.strip()
+            if line.startswith('{') and line.endswith('}'):
+                return line
         return None
     
-    try:
-        logger.info(f"🔍 Parseando JSON real de IOSoccer con {len(match_data)} campos")
+    return response[json_start:json_end+1]
+
+# ============= NORMALIZADOR DE ESQUEMA (PLANES DE ACCESO POR SERVIDOR) =============
+class SchemaPlan:
+    """
+    Variante del esquema de sv_matchinfojson detectada una vez, con accesores ya resueltos.
+    Evita volver a adivinar matchData/info/steamId/event... en cada jugador y cada evento.
+    """
+
+    def __init__(self, nested=False, player_info=False, steam_id_key='steamId', period_info=False,
+                 event_type_key='event', scorer_id_key='player1SteamId', assist_id_key='player2SteamId',
+                 second_key='second', position_key='startPosition'):
+        self.nested = nested
+        self.player_info = player_info
+        self.steam_id_key = steam_id_key
+        self.period_info = period_info
+        self.event_type_key = event_type_key
+        self.signature = (nested, player_info, steam_id_key, period_info, event_type_key,
+                          scorer_id_key, assist_id_key, second_key, position_key)
         
-        # EXTRAER DATOS DIRECTAMENTE DEL JSON (tu estructura real)
-        period_name = match_data.get('matchPeriod', 'N/A')
-        time_display = match_data.get('matchDisplaySeconds', '0:00')
-        current_time_seconds = match_data.get('matchSeconds', 0)
+        periods_key = 'matchPeriodData' if player_info else 'periods'
+        stats_key = 'statistics' if period_info else 'stats'
         
-        # NOMBRES REALES DE LOS EQUIPOS
-        team_home_name = match_data.get('teamNameHome', 'Local')
-        team_away_name = match_data.get('teamNameAway', 'Visitante')
+        # Accesores compilados para esta variante
+        if player_info:
+            def player_fields(player):
+                """(steam_id, nombre, períodos) de un jugador"""
+                info = player.get('info') or {}
+                return info.get(steam_id_key, ''), info.get('name'), player.get(periods_key) or ()
+        else:
+            def player_fields(player):
+                """(steam_id, nombre, períodos) de un jugador"""
+                return player.get(steam_id_key, ''), player.get('name'), player.get(periods_key) or ()
         
-        # GOLES REALES
+        if period_info:
+            def period_fields(period):
+                """(equipo, posición, estadísticas) de un período; equipo None si no tiene info"""
+                info = period.get('info')
+                if not info:
+                    return None, 'N/A', period.get(stats_key) or ()
+                return info.get('team'), info.get('position', 'N/A'), period.get(stats_key) or ()
+        else:
+            def period_fields(period):
+                """(equipo, posición, estadísticas) de un período"""
+                return period.get('team'), period.get('position', 'N/A'), period.get(stats_key) or ()
+        
+        def event_fields(event):
+            """Evento en forma canónica"""
+            return {
+                'type': (event.get(event_type_key) or '').upper(),
+                'second': event.get(second_key, 0),
+                'period': event.get('period'),
+                'team': event.get('team', 'unknown'),
+                'scorer_id': event.get(scorer_id_key, ''),
+                'scorer_name': event.get('player1Name'),
+                'assist_id': event.get(assist_id_key, ''),
+                'assist_name': event.get('player2Name'),
+                'body_part': event.get('bodyPart', 1),
+                'position': event.get(position_key, {}),
+            }
+        
+        self.player_fields = player_fields
+        self.period_fields = period_fields
+        self.event_fields = event_fields
+
+    def matches(self, payload):
+        """Chequeo O(1) de que el payload sigue teniendo la forma de este plan"""
+        nested = isinstance(payload.get('matchData'), dict)
+        if nested != self.nested:
+            return False
+        core = payload['matchData'] if nested else payload
+        
+        players = core.get('players')
+        if players:
+            first = players[0]
+            if ('info' in first) != self.player_info:
+                return False
+            info = (first.get('info') or {}) if self.player_info else first
+            if self.steam_id_key not in info:
+                return False
+        
+        events = core.get('matchEvents')
+        if events and self.event_type_key not in events[0]:
+            return False
+        return True
+
+def detect_player_schema(players):
+    """Variante de jugadores/períodos a partir del primer jugador"""
+    if not players:
+        return {}
+    first = players[0]
+    player_info = 'info' in first
+    info = (first.get('info') or {}) if player_info else first
+    periods = first.get('matchPeriodData' if player_info else 'periods') or []
+    return {
+        'player_info': player_info,
+        'steam_id_key': 'steamID' if 'steamID' in info and 'steamId' not in info else 'steamId',
+        'period_info': 'info' in periods[0] if periods else player_info,
+    }
+
+def detect_event_schema(events):
+    """Variante de eventos a partir del primer evento"""
+    if not events:
+        return {}
+    first = events[0]
+    return {
+        'event_type_key': 'type' if 'type' in first and 'event' not in first else 'event',
+        'scorer_id_key': 'scorerSteamId' if 'scorerSteamId' in first and 'player1SteamId' not in first else 'player1SteamId',
+        'assist_id_key': 'assistSteamId' if 'assistSteamId' in first and 'player2SteamId' not in first else 'player2SteamId',
+        'second_key': 'time' if 'time' in first and 'second' not in first else 'second',
+        'position_key': 'position' if 'position' in first and 'startPosition' not in first else 'startPosition',
+    }
+
+def detect_schema_plan(payload):
+    nested = isinstance(payload.get('matchData'), dict)
+    core = payload['matchData'] if nested else payload
+    return SchemaPlan(
+        nested=nested,
+        **detect_player_schema(core.get('players')),
+        **detect_event_schema(core.get('matchEvents'))
+    )
+
+schema_plans = {}  # server_id -> SchemaPlan
+
+def get_schema_plan(payload, server_id=None):
+    """Plan cacheado por servidor; solo se vuelve a detectar si el payload cambió de forma"""
+    plan = schema_plans.get(server_id) if server_id is not None else None
+    if plan is not None and plan.matches(payload):
+        return plan
+    
+    plan = detect_schema_plan(payload)
+    if server_id is not None:
+        schema_plans[server_id] = plan
+        server_logger(server_id).info("🧭 Esquema detectado para %s: %s", server_id, plan.signature)
+    return plan
+
+class NormalizedMatch:
+    """
+    Payload sv_matchinfojson en forma canónica.
+    Los eventos se normalizan en una pasada; jugadores y períodos se leen con los accesores del plan.
+    """
+
+    def __init__(self, payload, plan):
+        self.plan = plan
+        self.match = payload['matchData'] if plan.nested else payload
+        self.events = [plan.event_fields(event) for event in self.match.get('matchEvents') or ()]
+        self.teams = self.match.get('teams') or []
+
+def normalize_match_payload(payload, server_id=None):
+    return NormalizedMatch(payload, get_schema_plan(payload, server_id))
+
+def parse_match_info(match_data, server_id=None):
+    """
+    Parsea la información del partido desde el JSON REAL de IOSoccer
+    (plano o anidado en matchData; el plan de esquema se cachea por servidor)
+    """
+    if not match_data:
+        logger.warning("⚠️ parse_match_info: match_data es None o vacío")
+        return None
+    
+    try:
+        logger.info("🔍 Parseando JSON real de IOSoccer con %d campos", len(match_data))
+        normalized = normalize_match_payload(match_data, server_id)
+        match_data = normalized.match
+        
+        # EXTRAER DATOS DIRECTAMENTE DEL JSON (tu estructura real)
+        period_name = match_data.get('matchPeriod', 'N/A')
+        time_display = match_data.get('matchDisplaySeconds', '0:00')
+        current_time_seconds = match_data.get('matchSeconds', 0)
+        
+        # NOMBRES REALES DE LOS EQUIPOS
+        team_home_name = match_data.get('teamNameHome', 'Local')
+        team_away_name = match_data.get('teamNameAway', 'Visitante')
+        
+        # GOLES REALES
         goals_home = match_data.get('matchGoalsHome', 0)
         goals_away = match_data.get('matchGoalsAway', 0)
         
@@ -583,28 +1987,24 @@ def parse_match_info(match_data):
         match_format = match_data.get('matchFormat', 6)
         map_name = match_data.get('mapName', 'N/A')
         
-        # EVENTOS DE GOLES
-        events = match_data.get('matchEvents', [])
+        # EVENTOS DE GOLES (ya en forma canónica)
+        events = normalized.events
         goals_detail = []
         
         # Procesar eventos de goles
         for event in events:
-            if event.get('event') == 'GOAL':
-                goal_time_seconds = event.get('second', 0)
-                minutes = int(goal_time_seconds // 60)
-                seconds = int(goal_time_seconds % 60)
-                time_str = f"{minutes}:{seconds:02d}"
-                
+            if event['type'] == 'GOAL':
                 goal_info = {
-                    'minute': time_str,
-                    'team': event.get('team', 'unknown'),
-                    'scorer_name': event.get('player1Name', 'Unknown'),
-                    'assist_name': event.get('player2Name', '') if event.get('player2Name') else '',
-                    'period': event.get('period', period_name)
+                    'minute': seconds_to_minutes(event['second']),
+                    'team': event['team'],
+                    'scorer_name': event['scorer_name'] or 'Unknown',
+                    'assist_name': event['assist_name'] or '',
+                    'period': event['period'] or period_name
                 }
                 goals_detail.append(goal_info)
         
-        logger.info(f"✅ Parseado exitoso: {team_home_name} {goals_home}-{goals_away} {team_away_name} ({time_display}, {period_name})")
+        logger.info("✅ Parseado exitoso: %s %s-%s %s (%s, %s)", team_home_name, goals_home, goals_away,
+                    team_away_name, time_display, period_name)
         
         return {
             'period': period_name,
@@ -636,109 +2036,120 @@ def parse_match_info(match_data):
         logger.error(f"❌ Error parsing match info: {e}")
         return None
 
-def parse_goals_from_real_events(events):
+# ============= SNAPSHOT RECORTADO (MEMORIA ACOTADA POR SERVIDOR) =============
+SNAPSHOT_MODE = os.getenv('SNAPSHOT_MODE', 'trim').lower()  # 'trim' o 'full'
+
+# Únicos campos de match_info que usan los embeds y los comandos
+SNAPSHOT_MATCH_FIELDS = (
+    'period', 'time_display', 'time_seconds', 'map_name', 'format',
+    'team_home', 'team_away', 'goals_home', 'goals_away', 'players_count', 'max_players',
+)
+
+def project_match_info(match_info):
     """
-    Parsea goles desde TU estructura real de eventos
+    Proyecta el match_info parseado a lo mínimo que necesita el renderizado.
+    Los eventos y lineups crudos se reemplazan por sus cantidades para no retenerlos.
+    """
+    if not match_info or SNAPSHOT_MODE == 'full':
+        return match_info
+    
+    compact = {field: match_info[field] for field in SNAPSHOT_MATCH_FIELDS}
+    compact['goals_detail'] = tuple(
+        {
+            'minute': goal['minute'],
+            'team': goal['team'],
+            'scorer_name': goal['scorer_name'],
+            'assist_name': goal['assist_name'],
+        }
+        for goal in match_info.get('goals_detail', ())
+    )
+    compact['events_count'] = len(match_info.get('events', ()))
+    compact['lineup_home_count'] = len(match_info.get('lineup_home', ()))
+    compact['lineup_away_count'] = len(match_info.get('lineup_away', ()))
+    return compact
+
+def parse_goals_from_real_events(events, plan):
+    """
+    Parsea goles desde TU estructura real de eventos (plan: el SchemaPlan cacheado del servidor)
     """
     if not events:
         return []
     
+    event_fields = plan.event_fields
     goals = []
     
-    for event in events:
-        if event.get('event') == 'GOAL':
-            goal_time_seconds = event.get('second', 0)
-            
+    for raw_event in events:
+        event = event_fields(raw_event)
+        if event['type'] == 'GOAL':
             goal_info = {
-                'minute': seconds_to_minutes(goal_time_seconds),
-                'period': event.get('period', 'N/A'),
-                'team': event.get('team', 'unknown'),
-                'team_name': 'Local' if event.get('team') == 'home' else 'Visitante',
-                'scorer_id': event.get('player1SteamId', ''),
-                'scorer_name': event.get('player1Name', 'Unknown'),
-                'assist_id': event.get('player2SteamId', ''),
-                'assist_name': event.get('player2Name', ''),
-                'body_part': event.get('bodyPart', 1),
-                'position': event.get('startPosition', {})
+                'minute': seconds_to_minutes(event['second']),
+                'period': event['period'] or 'N/A',
+                'team': event['team'],
+                'team_name': 'Local' if event['team'] == 'home' else 'Visitante',
+                'scorer_id': event['scorer_id'],
+                'scorer_name': event['scorer_name'] or 'Unknown',
+                'assist_id': event['assist_id'],
+                'assist_name': event['assist_name'] or '',
+                'body_part': event['body_part'],
+                'position': event['position']
             }
             goals.append(goal_info)
     
     return goals
 
-def count_real_players(players):
+def count_real_players(players, plan):
     """
     Cuenta solo los jugadores reales (no bots) - VERSIÓN MEJORADA
     """
     if not players:
         return 0
     
+    player_fields = plan.player_fields
     real_players = 0
     for player in players:
-        # Diferentes estructuras posibles
-        if 'info' in player:
-            player_info = player['info']
-        else:
-            player_info = player
-        
-        steam_id = player_info.get('steamId', player_info.get('steamID', ''))
-        name = player_info.get('name', '')
+        steam_id, name, _ = player_fields(player)
         
         # Filtrar bots y SourceTV
-        if (steam_id and 
-            steam_id != 'BOT' and 
-            steam_id != 'SourceTV' and 
-            not name.startswith('Bot') and
-            steam_id != '0'):
+        if steam_id not in NON_PLAYER_STEAM_IDS and not (name or '').startswith('Bot'):
             real_players += 1
     
     return real_players
 
-def extract_team_players_improved(players, team_side, team_name=None):
+def extract_team_players_improved(players, team_side, team_name=None, *, plan):
     """
     Extrae jugadores de un equipo específico - VERSIÓN MEJORADA
     """
     team_players = []
     
     for player in players:
-        if 'info' in player:
-            player_info = player['info']
-            periods = player.get('matchPeriodData', [])
-        else:
-            player_info = player
-            periods = player.get('periods', [])
-        
-        steam_id = player_info.get('steamId', player_info.get('steamID', ''))
-        name = player_info.get('name', 'Unknown')
+        steam_id, name, periods = plan.player_fields(player)
         
         # Filtrar bots y SourceTV
-        if steam_id in ['BOT', 'SourceTV'] or not steam_id or steam_id == '0':
+        if steam_id in NON_PLAYER_STEAM_IDS:
             continue
         
-        # Buscar equipo actual del jugador en el último período
+        # Buscar equipo actual del jugador en el último período con datos
         current_team = None
         current_position = 'N/A'
-        
-        if periods:
-            # Obtener el último período activo
-            active_periods = [p for p in periods if 'info' in p and p['info']]
-            if active_periods:
-                last_period = active_periods[-1]
-                period_info = last_period['info']
-                current_team = period_info.get('team', '')
-                current_position = period_info.get('position', 'N/A')
+        for period in reversed(periods):
+            team, position, _ = plan.period_fields(period)
+            if team is not None:
+                current_team = team
+                current_position = position
+                break
         
         # Solo incluir jugadores del equipo solicitado
         if current_team == team_side:
             team_players.append({
                 'steamId': steam_id,
-                'name': name,
+                'name': name or 'Unknown',
                 'position': current_position,
                 'team_name': team_name or team_side.title()
             })
     
     return team_players
 
-def parse_goals_from_events_improved(events, players, teams):
+def parse_goals_from_events_improved(events, players, teams, plan):
     """
     Extrae información detallada de goles desde los eventos - VERSIÓN MEJORADA
     Returns: list de dict con información de cada gol
@@ -751,16 +2162,9 @@ def parse_goals_from_events_improved(events, players, teams):
     # Crear diccionario de jugadores para búsqueda rápida
     player_dict = {}
     for player in players:
-        if 'info' in player:
-            player_info = player['info']
-        else:
-            player_info = player
-        
-        steam_id = player_info.get('steamId', player_info.get('steamID', ''))
-        name = player_info.get('name', 'Unknown')
-        
+        steam_id, name, _ = plan.player_fields(player)
         if steam_id and steam_id != 'BOT' and steam_id != 'SourceTV':
-            player_dict[steam_id] = name
+            player_dict[steam_id] = name or 'Unknown'
     
     # Crear diccionario de nombres de equipos
     team_names = {}
@@ -773,31 +2177,28 @@ def parse_goals_from_events_improved(events, players, teams):
             team_names['away'] = teams[1]['matchTotal']['name']
     
     # Procesar eventos de goles
-    for event in events:
-        event_type = event.get('event', event.get('type', ''))
+    for raw_event in events:
+        event = plan.event_fields(raw_event)
         
-        if event_type.upper() == 'GOAL':
-            scorer_id = event.get('player1SteamId', event.get('scorerSteamId', ''))
-            assist_id = event.get('player2SteamId', event.get('assistSteamId', ''))
-            
-            # Tiempo del gol
-            goal_time_seconds = event.get('second', event.get('time', 0))
+        if event['type'] == 'GOAL':
+            scorer_id = event['scorer_id']
+            assist_id = event['assist_id']
             
             # Determinar equipo del gol basado en el scorer
-            goal_team = event.get('team', 'unknown')
+            goal_team = event['team']
             team_name = team_names.get(goal_team, goal_team.title() if goal_team != 'unknown' else 'Unknown')
             
             goal_info = {
-                'minute': seconds_to_minutes(goal_time_seconds),
-                'period': event.get('period', 'N/A'),
+                'minute': seconds_to_minutes(event['second']),
+                'period': event['period'] or 'N/A',
                 'team': goal_team,
                 'team_name': team_name,
                 'scorer_id': scorer_id,
                 'assist_id': assist_id,
                 'scorer_name': player_dict.get(scorer_id, 'Unknown'),
                 'assist_name': player_dict.get(assist_id, '') if assist_id else '',
-                'body_part': event.get('bodyPart', 1),  # 1=pie, 4=cabeza
-                'position': event.get('startPosition', event.get('position', {}))
+                'body_part': event['body_part'],  # 1=pie, 4=cabeza
+                'position': event['position']
             }
             goals.append(goal_info)
     
@@ -814,22 +2215,14 @@ def seconds_to_minutes(seconds):
     remaining_seconds = int(seconds % 60)
     return f"{minutes}:{remaining_seconds:02d}"
 
-def get_player_goals_stats(players, team_side):
+def get_player_goals_stats(players, team_side, plan):
     """
     Obtiene estadísticas de goles por jugador de un equipo específico
     """
     player_goals = {}
     
     for player in players:
-        if 'info' in player:
-            player_info = player['info']
-            periods = player.get('matchPeriodData', [])
-        else:
-            player_info = player
-            periods = player.get('periods', [])
-        
-        steam_id = player_info.get('steamId', player_info.get('steamID', ''))
-        name = player_info.get('name', 'Unknown')
+        steam_id, name, periods = plan.player_fields(player)
         
         if steam_id == 'BOT' or not steam_id:
             continue
@@ -838,15 +2231,10 @@ def get_player_goals_stats(players, team_side):
         total_assists = 0
         
         # Sumar goles de todos los períodos
-        for period_data in periods:
-            if 'info' in period_data:
-                period_info = period_data['info']
-                stats = period_data.get('statistics', [])
-            else:
-                period_info = period_data
-                stats = period_data.get('stats', [])
+        for period in periods:
+            team, _, stats = plan.period_fields(period)
             
-            if period_info.get('team') == team_side:
+            if team == team_side:
                 if len(stats) > 12:  # índice 12 = goles
                     total_goals += stats[12]
                 if len(stats) > 14:  # índice 14 = asistencias
@@ -854,7 +2242,7 @@ def get_player_goals_stats(players, team_side):
         
         if total_goals > 0 or total_assists > 0:
             player_goals[steam_id] = {
-                'name': name,
+                'name': name or 'Unknown',
                 'goals': total_goals,
                 'assists': total_assists
             }
@@ -909,8 +2297,230 @@ def get_active_players(lineup):
             })
     return active_players
 
+# ============= CLASIFICACIONES ACUMULADAS (GOLES / ASISTENCIAS) =============
+LEADERBOARD_FILE = os.getenv('LEADERBOARD_FILE', 'leaderboards.json')
+LEADERBOARD_TOP_K = 10
+LEADERBOARD_SAVE_DELAY = float(os.getenv('LEADERBOARD_SAVE_DELAY', '5'))  # Agrupa los goles de unos segundos en una escritura
+NON_PLAYER_STEAM_IDS = {'', '0', 'BOT', 'SourceTV'}
+
+class Leaderboard:
+    """Contadores de goles y asistencias por steamId con top-k cacheado"""
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.stats = {
+            'goals': dict(data.get('goals', {})),
+            'assists': dict(data.get('assists', {})),
+        }
+        self.names = dict(data.get('names', {}))  # steamId -> último nombre visto
+        # stat -> steamIds del top-k ordenados por cantidad; se calcula una vez al cargar
+        self._top = {
+            stat: [steam_id for steam_id, _ in heapq.nlargest(LEADERBOARD_TOP_K, counts.items(), key=lambda item: item[1])]
+            for stat, counts in self.stats.items()
+        }
+
+    def add(self, stat, steam_id, name):
+        counts = self.stats[stat]
+        count = counts.get(steam_id, 0) + 1
+        counts[steam_id] = count
+        if name:
+            self.names[steam_id] = name
+        
+        # Los contadores solo suben de a 1: alcanza con reubicar a este jugador dentro del top-k
+        top = self._top[stat]
+        if steam_id not in top:
+            if len(top) < LEADERBOARD_TOP_K:
+                top.append(steam_id)
+            elif count > counts[top[-1]]:
+                top[-1] = steam_id
+            else:
+                return
+        top.sort(key=counts.__getitem__, reverse=True)
+
+    def top(self, stat, limit=LEADERBOARD_TOP_K):
+        """Devuelve [(nombre, cantidad)] de los mejores `limit` jugadores"""
+        counts = self.stats[stat]
+        return [(self.names.get(steam_id, steam_id), counts[steam_id]) for steam_id in self._top[stat][:limit]]
+
+    def to_dict(self):
+        return {'goals': dict(self.stats['goals']), 'assists': dict(self.stats['assists']), 'names': dict(self.names)}
+
+class LeaderboardStore:
+    """Clasificaciones globales y por servidor, actualizadas solo con goles nuevos"""
+
+    def __init__(self, path=LEADERBOARD_FILE):
+        self.path = path
+        self.global_board = Leaderboard()
+        self.server_boards = {}  # server_id -> Leaderboard
+        self.seen_goals = {}     # server_id -> claves de goles ya contados del partido actual
+        self._save_task = None
+        self.load()
+
+    def board(self, server_id=None):
+        if server_id is None:
+            return self.global_board
+        if server_id not in self.server_boards:
+            self.server_boards[server_id] = Leaderboard()
+        return self.server_boards[server_id]
+
+    @staticmethod
+    def goal_key(event):
+        # str(valor) por campo (0 queda como '0'); solo None queda vacío
+        return '|'.join('' if event[field] is None else str(event[field]) for field in
+                        ('period', 'second', 'team', 'scorer_id', 'assist_id'))
+
+    def record_events(self, server_id, events):
+        """
+        Suma a las clasificaciones los goles de `events` (forma canónica) que todavía no se contaron.
+        Si los goles ya vistos no aparecen en los eventos actuales, empezó otro partido.
+        Returns: cantidad de goles nuevos
+        """
+        goal_events = [event for event in events or [] if event['type'] == 'GOAL']
+        keys = [self.goal_key(event) for event in goal_events]
+
+        seen = self.seen_goals.get(server_id, set())
+        if not seen.issubset(keys):
+            seen = set()  # Partido nuevo
+        self.seen_goals[server_id] = seen
+
+        new_goals = 0
+        for key, event in zip(keys, goal_events):
+            if key in seen:
+                continue
+            seen.add(key)
+            new_goals += 1
+
+            for stat, id_field, name_field in (('goals', 'scorer_id', 'scorer_name'),
+                                               ('assists', 'assist_id', 'assist_name')):
+                steam_id = event[id_field] or ''
+                if steam_id in NON_PLAYER_STEAM_IDS:
+                    continue
+                self.global_board.add(stat, steam_id, event[name_field])
+                self.board(server_id).add(stat, steam_id, event[name_field])
+
+        if new_goals:
+            logger.info("🏅 Clasificaciones: %d goles nuevos en %s", new_goals, server_id, extra={'event': 'leaderboard_goals'})
+            self.schedule_save()
+        return new_goals
+
+    def schedule_save(self):
+        """Escritura diferida fuera del event loop; sin loop (replay, bench) guarda en el momento"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(LEADERBOARD_SAVE_DELAY)
+        data = self.to_dict()  # Copia tomada en el loop: el hilo no ve dicts a medio modificar
+        await asyncio.to_thread(self.write, data)
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"❌ No se pudieron cargar las clasificaciones de {self.path}: {e}")
+            return
+
+        self.global_board = Leaderboard(data.get('global'))
+        self.server_boards = {server_id: Leaderboard(board) for server_id, board in data.get('servers', {}).items()}
+        self.seen_goals = {server_id: set(keys) for server_id, keys in data.get('seen_goals', {}).items()}
+        logger.info(f"🏅 Clasificaciones cargadas desde {self.path}")
+
+    def to_dict(self):
+        return {
+            'global': self.global_board.to_dict(),
+            'servers': {server_id: board.to_dict() for server_id, board in self.server_boards.items()},
+            'seen_goals': {server_id: sorted(keys) for server_id, keys in self.seen_goals.items()},
+        }
+
+    def save(self):
+        self.write(self.to_dict())
+
+    def write(self, data):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"❌ No se pudieron guardar las clasificaciones en {self.path}: {e}")
+
+leaderboards = LeaderboardStore()
+
+# ============= CACHE DE RENDERIZADO DE EMBEDS =============
+EMBED_CACHE_SIZE = int(os.getenv('EMBED_CACHE_SIZE', '64'))
+
+class EmbedRenderCache:
+    """Cache LRU de embeds ya renderizados (como dict), indexada por la huella del estado"""
+
+    def __init__(self, max_size=EMBED_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, fingerprint):
+        embed_dict = self._entries.get(fingerprint)
+        if embed_dict is not None:
+            self._entries.move_to_end(fingerprint)
+        return embed_dict
+
+    def put(self, fingerprint, embed_dict):
+        self._entries[fingerprint] = embed_dict
+        self._entries.move_to_end(fingerprint)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)  # Expulsar el menos usado
+        return embed_dict
+
+embed_render_cache = EmbedRenderCache()
+
+def embed_from_cache(embed_dict):
+    """Reconstruye un Embed desde el cache sin compartir la lista de fields"""
+    data = dict(embed_dict)
+    if 'fields' in data:
+        data['fields'] = [dict(field) for field in data['fields']]
+    return discord.Embed.from_dict(data)
+
+def match_embed_fingerprint(server_info):
+    """Huella estable de todo lo que se ve en el embed de un servidor"""
+    match_info = server_info.match_info
+    if not match_info:
+        return ('basic', server_info.name, server_info.address, server_info.status, server_info.players,
+                server_info.max_players, server_info.map_name)
+
+    goals = tuple(
+        (goal['minute'], goal['team'], goal['scorer_name'], goal['assist_name'])
+        for goal in match_info.get('goals_detail') or ()
+    )
+    return ('match', server_info.name, server_info.address, match_info['format'], match_info['team_home'],
+            match_info['team_away'], match_info['goals_home'], match_info['goals_away'],
+            match_info['period'], match_info['time_display'], match_info['players_count'],
+            match_info['max_players'], match_info['map_name'], goals)
+
 def create_match_embed_improved(server_info):
-    """Crea embed detallado con información del partido - VERSIÓN PARA TU JSON REAL"""
+    """Crea embed detallado con información del partido (reutiliza el render si el estado no cambió)"""
+    fingerprint = match_embed_fingerprint(server_info)
+    embed_dict = embed_render_cache.get(fingerprint)
+    if embed_dict is None:
+        embed_dict = embed_render_cache.put(fingerprint, render_match_embed(server_info).to_dict())
+
+    embed = embed_from_cache(embed_dict)
+
+    # Solo el timestamp y el footer cambian entre ciclos
+    if server_info.match_info:
+        now = datetime.now()
+        embed.timestamp = now
+        embed.set_footer(text=f"🔄 Actualizado | {now.strftime('%H:%M:%S')}")
+
+    return embed
+
+def render_match_embed(server_info):
+    """Construye el embed detallado del partido - VERSIÓN PARA TU JSON REAL"""
     if not server_info.match_info:
         # CAMBIAR este embed para que use datos A2S básicos
         embed = discord.Embed(
@@ -918,8 +2528,7 @@ def create_match_embed_improved(server_info):
             color=0x00ff00 if "Online" in server_info.status else 0xff0000
         )
         
-        server_config = next((s for s in SERVERS if s['name'] == server_info.name), None)
-        connect_info = f"{server_config['ip']}:{server_config['port']}" if server_config else "N/A"
+        connect_info = server_info.address or "N/A"
         
         if "Online" in server_info.status:
             embed.add_field(
@@ -959,13 +2568,11 @@ def create_match_embed_improved(server_info):
     embed = discord.Embed(
         title=f"⚽ {server_info.name} - {match_info['format']}",
         description=f"**{match_info['team_home']}** vs **{match_info['team_away']}**",
-        color=color,
-        timestamp=datetime.now()
+        color=color
     )
     
     # Información del servidor
-    server_config = next((s for s in SERVERS if s['name'] == server_info.name), None)
-    connect_info = f"{server_config['ip']}:{server_config['port']}" if server_config else "N/A"
+    connect_info = server_info.address or "N/A"
     
     embed.add_field(
         name="📊 Información del Servidor",
@@ -1063,189 +2670,1619 @@ def create_match_embed_improved(server_info):
             inline=True
         )
     
-    # Footer
-    embed.set_footer(text=f"🔄 Actualizado | {datetime.now().strftime('%H:%M:%S')}")
+    return embed
+
+def summarize_servers(servers_info):
+    """Calcula (online, jugadores totales, partidos activos, total servidores)"""
+    online_count = 0
+    total_players = 0
+    active_matches = 0
+    
+    for server_info in servers_info:
+        if "Online" in server_info.status:
+            online_count += 1
+            total_players += server_info.players
+            
+            # Verificar si hay partido activo
+            if (server_info.match_info and 
+                server_info.match_info['period'].upper() in ['FIRST HALF', 'SECOND HALF', 'PLAYING']):
+                active_matches += 1
+    
+    return online_count, total_players, active_matches, len(servers_info)
+
+def create_status_embed(servers_info):
+    """Crea el embed de estado general de todos los servidores"""
+    summary_values = summarize_servers(servers_info)
+    fingerprint = ('status',) + summary_values
+    embed_dict = embed_render_cache.get(fingerprint)
+    if embed_dict is None:
+        embed_dict = embed_render_cache.put(fingerprint, render_status_embed(*summary_values).to_dict())
+
+    embed = embed_from_cache(embed_dict)
+    now = datetime.now()
+    embed.timestamp = now
+    embed.set_footer(
+        text=f"🔄 Actualizado con Match Info JSON | {now.strftime('%H:%M:%S')}"
+    )
+    
+    return embed
+
+def render_status_embed(online_count, total_players, active_matches, total_servers):
+    """Construye el embed de resumen general"""
+    embed = discord.Embed(
+        title="⚽ Estado Servidores IOSoccer",
+        description="Información en tiempo real con Match Info JSON",
+        color=0x00ff00
+    )
+    
+    # Resumen general
+    summary = f"**🌐 Servidores Online:** {online_count}/{total_servers}\n"
+    summary += f"**👥 Jugadores Totales:** {total_players}\n"
+    summary += f"**⚽ Partidos Activos:** {active_matches}"
+    
+    embed.add_field(
+        name="📊 Resumen General",
+        value=summary,
+        inline=False
+    )
+    
+    return embed
+
+# ============= DESPACHADOR GLOBAL DE EDICIONES DE DISCORD =============
+# Límites de Discord: ~5 ediciones cada 5s por canal y 50 requests/s globales
+DISCORD_CHANNEL_EDIT_RATE = float(os.getenv('DISCORD_CHANNEL_EDIT_RATE', '1'))     # Ediciones/s por canal
+DISCORD_CHANNEL_EDIT_BURST = float(os.getenv('DISCORD_CHANNEL_EDIT_BURST', '5'))
+DISCORD_GLOBAL_EDIT_RATE = float(os.getenv('DISCORD_GLOBAL_EDIT_RATE', '40'))      # Ediciones/s totales
+DISCORD_GLOBAL_EDIT_BURST = float(os.getenv('DISCORD_GLOBAL_EDIT_BURST', '50'))
+
+# Prioridades (menor = antes)
+EDIT_PRIORITY_EVENT = 0     # Cambió el marcador, el período o el estado del servidor
+EDIT_PRIORITY_NORMAL = 1    # Primera edición de un mensaje o sin clave de cambio
+EDIT_PRIORITY_CLOCK = 2     # Solo avanzó el reloj / antigüedad
+EDIT_PRIORITY_PROGRESS = 3  # Embeds de "actualizando..."
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self):
+        self._refill()
+        return self.tokens >= 1.0
+
+    def take(self):
+        self.tokens -= 1.0
+
+    def wait_time(self):
+        """Segundos hasta que haya un token"""
+        self._refill()
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+class PendingEdit:
+    __slots__ = ('priority', 'seq', 'message', 'kwargs', 'change_key', 'waiters')
+
+    def __init__(self, priority, seq, message, kwargs, change_key):
+        self.priority = priority
+        self.seq = seq
+        self.message = message
+        self.kwargs = kwargs
+        self.change_key = change_key
+        self.waiters = []
+
+class DiscordEditDispatcher:
+    """
+    Cola única de ediciones para todos los canales con auto-update.
+    - Token bucket por canal y uno global
+    - Heap de prioridades: goles/períodos antes que ediciones de solo reloj
+    - Coalescencia: si un mensaje ya tiene una edición pendiente se reemplaza,
+      así solo se envía el embed más reciente
+    """
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(DISCORD_GLOBAL_EDIT_RATE, DISCORD_GLOBAL_EDIT_BURST)
+        self.channel_buckets = {}  # channel_id -> TokenBucket
+        self.pending = {}          # message_id -> PendingEdit
+        self.last_change_keys = {} # message_id -> clave de la última edición enviada
+        self._heap = []            # (priority, seq, message_id)
+        self._seq = 0
+        self._wakeup = None
+        self._worker = None
+        self.sent = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    def priority_for(self, message_id, change_key):
+        if change_key is None or message_id not in self.last_change_keys:
+            return EDIT_PRIORITY_NORMAL
+        if change_key != self.last_change_keys[message_id]:
+            return EDIT_PRIORITY_EVENT
+        return EDIT_PRIORITY_CLOCK
+
+    def submit(self, message, change_key=None, priority=None, **kwargs):
+        """
+        Encola `message.edit(**kwargs)`. Returns: future que se resuelve con True/False
+        cuando se envía la edición (o la que la reemplazó).
+        """
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        
+        if priority is None:
+            priority = self.priority_for(message.id, change_key)
+        
+        self._seq += 1
+        waiter = asyncio.get_running_loop().create_future()
+        previous = self.pending.get(message.id)
+        edit = PendingEdit(priority, self._seq, message, kwargs, change_key)
+        if previous is not None:
+            # Se descarta el embed viejo pero se conserva la mejor prioridad
+            self.coalesced += 1
+            edit.priority = min(priority, previous.priority)
+            edit.waiters = previous.waiters
+        edit.waiters.append(waiter)
+        
+        self.pending[message.id] = edit
+        heapq.heappush(self._heap, (edit.priority, edit.seq, message.id))
+        self._wakeup.set()
+        return waiter
+
+    def _channel_bucket(self, channel_id):
+        bucket = self.channel_buckets.get(channel_id)
+        if bucket is None:
+            bucket = TokenBucket(DISCORD_CHANNEL_EDIT_RATE, DISCORD_CHANNEL_EDIT_BURST)
+            self.channel_buckets[channel_id] = bucket
+        return bucket
+
+    def _next_ready(self):
+        """Saca la edición de mayor prioridad cuyo canal tenga tokens, o None"""
+        if not self.global_bucket.available():
+            return None
+        
+        deferred = []
+        ready = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            _, seq, message_id = entry
+            edit = self.pending.get(message_id)
+            if edit is None or edit.seq != seq:
+                continue  # Entrada reemplazada por una edición más nueva
+            bucket = self._channel_bucket(edit.message.channel.id)
+            if not bucket.available():
+                deferred.append(entry)
+                continue
+            bucket.take()
+            self.global_bucket.take()
+            del self.pending[message_id]
+            ready = edit
+            break
+        
+        for entry in deferred:
+            heapq.heappush(self._heap, entry)
+        return ready
+
+    def _next_delay(self):
+        if not self.pending:
+            return None
+        channel_wait = min(self._channel_bucket(edit.message.channel.id).wait_time()
+                           for edit in self.pending.values())
+        return max(channel_wait, self.global_bucket.wait_time())
+
+    async def _run(self):
+        while True:
+            edit = self._next_ready()
+            if edit is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._next_delay())
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._send(edit)
+
+    async def _send(self, edit):
+        message = edit.message
+        ok = True
+        try:
+            with tracer.span('discord_edit', track=f"canal {message.channel.id}", priority=edit.priority):
+                await message.edit(**edit.kwargs)
+            self.sent += 1
+            if edit.change_key is not None:
+                self.last_change_keys[message.id] = edit.change_key
+        except Exception as e:
+            ok = False
+            self.failed += 1
+            logger.error(f"❌ Error editando mensaje {message.id} en canal {message.channel.id}: {e}")
+        
+        for waiter in edit.waiters:
+            if not waiter.done():
+                waiter.set_result(ok)
+
+    def forget(self, messages):
+        """Descarta ediciones pendientes y estado de mensajes que ya no se actualizan"""
+        for message in messages:
+            edit = self.pending.pop(message.id, None)
+            if edit is not None:
+                for waiter in edit.waiters:
+                    if not waiter.done():
+                        waiter.set_result(False)
+            self.last_change_keys.pop(message.id, None)
+
+    def describe(self):
+        return (f"{self.sent} enviadas, {self.coalesced} coalescidas, "
+                f"{self.failed} fallidas, {len(self.pending)} pendientes")
+
+discord_edits = DiscordEditDispatcher()
+
+def match_change_key(server_info):
+    """Lo que hace urgente una edición de detalle: estado, marcador y período"""
+    match_info = server_info.match_info
+    if not match_info:
+        return (server_info.status, server_info.players)
+    return (server_info.status, match_info.get('goals_home'), match_info.get('goals_away'), match_info.get('period'))
+
+def summary_change_key(servers_info):
+    return summarize_servers(servers_info)
+
+# ============= LAYOUT COMPACTO (VARIOS EMBEDS POR MENSAJE) =============
+# 'separate': un mensaje de resumen + uno por servidor (N+1 ediciones por ciclo)
+# 'compact': resumen y detalles agrupados de a 10 embeds por mensaje (ceil((N+1)/10) ediciones)
+STATUS_LAYOUT = os.getenv('STATUS_LAYOUT', 'separate').lower()
+MAX_EMBEDS_PER_MESSAGE = 10     # Límite de Discord
+MAX_EMBED_CHARS_PER_MESSAGE = 6000  # Límite de Discord para la suma de todos los embeds del mensaje
+
+def chunk_embeds(embeds):
+    """Agrupa embeds en mensajes respetando los límites de cantidad y de caracteres"""
+    chunks = []
+    current = []
+    current_chars = 0
+    for embed in embeds:
+        embed_chars = len(embed)
+        if current and (len(current) >= MAX_EMBEDS_PER_MESSAGE or
+                        current_chars + embed_chars > MAX_EMBED_CHARS_PER_MESSAGE):
+            chunks.append(current)
+            current = []
+            current_chars = 0
+        current.append(embed)
+        current_chars += embed_chars
+    if current:
+        chunks.append(current)
+    return chunks
+
+def build_status_embeds(servers_info, snapshots, footer_text):
+    """[resumen, detalle de cada servidor] con footers de antigüedad (sin footer si el snapshot ya no está)"""
+    status_embed = create_status_embed(servers_info)
+    status_embed.set_footer(text=footer_text)
+    add_snapshot_age_footer(status_embed, oldest_snapshot(snapshots))
+    
+    embeds = [status_embed]
+    for server_info, snapshot in zip(servers_info, snapshots):
+        embeds.append(add_snapshot_age_footer(create_match_embed_improved(server_info), snapshot))
+    return embeds
+
+def oldest_snapshot(snapshots):
+    return min((snapshot for snapshot in snapshots if snapshot), key=lambda snapshot: snapshot['updated_at'], default=None)
+
+async def send_compact_status(channel, embeds):
+    """Envía los embeds agrupados y devuelve la lista de mensajes"""
+    messages = []
+    for chunk in chunk_embeds(embeds):
+        messages.append(await channel.send(embeds=chunk))
+    return messages
+
+async def sync_compact_status(channel, messages, embeds, track='bot', change_keys=None):
+    """
+    Encola la edición de los mensajes existentes con los nuevos grupos de embeds.
+    Si cambia la cantidad de grupos (p. ej. por el límite de caracteres) se envían
+    o borran mensajes al final; `messages` se modifica en el lugar.
+    """
+    chunks = chunk_embeds(embeds)
+    
+    position = 0
+    for i, chunk in enumerate(chunks):
+        chunk_key = tuple(change_keys[position:position + len(chunk)]) if change_keys else None
+        position += len(chunk)
+        if i < len(messages):
+            discord_edits.submit(messages[i], change_key=chunk_key, embeds=chunk)
+        else:
+            with tracer.span('discord_send', track=track, message=f"grupo {i + 1}", embeds=len(chunk)):
+                messages.append(await channel.send(embeds=chunk))
+    
+    while len(messages) > len(chunks):
+        surplus = messages.pop()
+        discord_edits.forget([surplus])
+        try:
+            await surplus.delete()
+        except Exception:
+            pass
+
+# ============= FUNCIÓN DE AUTO-UPDATE =============
+STATUS_UPDATE_INTERVAL = int(os.getenv('STATUS_UPDATE_INTERVAL', '90'))  # Período fijo entre ciclos (segundos)
+STATUS_MAX_CONCURRENT_CYCLES = int(os.getenv('STATUS_MAX_CONCURRENT_CYCLES', '2'))  # Ciclos de canales distintos a la vez
+STATUS_CYCLE_REUSE_AGE = int(os.getenv('STATUS_CYCLE_REUSE_AGE', '15'))  # Snapshot reutilizable por otro ciclo o !status
+
+class CycleStats:
+    """Métricas de los ciclos de auto-update: duración, overruns y ticks salteados"""
+    
+    def __init__(self):
+        self.cycles = 0
+        self.overruns = 0
+        self.skipped_ticks = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_duration = 0.0
+        self.max_lateness = 0.0  # Espera por cupo de concurrencia
+    
+    def record(self, duration, lateness):
+        self.cycles += 1
+        self.total_duration += duration
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        self.max_lateness = max(self.max_lateness, lateness)
+    
+    def describe(self):
+        if not self.cycles:
+            return "Sin ciclos todavía"
+        return (f"{self.cycles} ciclos cada {STATUS_UPDATE_INTERVAL}s, "
+                f"duración media {self.total_duration / self.cycles:.1f}s (máx {self.max_duration:.1f}s), "
+                f"{self.overruns} overruns, {self.skipped_ticks} ticks salteados, "
+                f"espera máx por cupo {self.max_lateness:.1f}s")
+
+status_cycle_stats = CycleStats()
+status_cycle_slots = None  # asyncio.Semaphore, se crea dentro del event loop
+
+class FixedRateScheduler:
+    """
+    Ejecuta un ciclo en una grilla fija (inicio + n * intervalo) en lugar de dormir
+    un intervalo después de cada ciclo, así el período real no crece con la duración.
+    Si un ciclo se pasa del próximo tick, los ticks vencidos se saltean y el siguiente
+    ciclo arranca en el próximo punto de la grilla: nunca hay dos ciclos solapados.
+    """
+    
+    def __init__(self, interval, stats, slots=None, name="scheduler"):
+        self.interval = interval
+        self.stats = stats
+        self.slots = slots
+        self.name = name
+        self.next_tick = None
+    
+    def advance(self, now):
+        """Avanza al próximo tick de la grilla posterior a `now`. Returns: ticks salteados"""
+        self.next_tick += self.interval
+        if now <= self.next_tick:
+            return 0
+        skipped = int((now - self.next_tick) // self.interval) + 1
+        self.next_tick += skipped * self.interval
+        return skipped
+    
+    async def run(self, cycle):
+        """Llama a `await cycle(n)` en cada tick, para siempre"""
+        loop = asyncio.get_running_loop()
+        self.next_tick = loop.time() + self.interval
+        count = 0
+        while True:
+            await asyncio.sleep(max(0.0, self.next_tick - loop.time()))
+            count += 1
+            
+            scheduled = self.next_tick
+            if self.slots is not None:
+                await self.slots.acquire()
+            started = loop.time()
+            try:
+                await cycle(count)
+            finally:
+                if self.slots is not None:
+                    self.slots.release()
+            finished = loop.time()
+            self.stats.record(finished - started, started - scheduled)
+            
+            skipped = self.advance(finished)
+            if skipped:
+                self.stats.overruns += 1
+                self.stats.skipped_ticks += skipped
+                logger.warning("⏱️ %s: ciclo #%d tardó %.1fs (período %ds), %d tick(s) salteado(s)",
+                               self.name, count, finished - scheduled, self.interval, skipped,
+                               extra={'event': 'cycle_overrun'})
+
+def get_status_cycle_slots():
+    global status_cycle_slots
+    if status_cycle_slots is None:
+        status_cycle_slots = asyncio.Semaphore(max(1, STATUS_MAX_CONCURRENT_CYCLES))
+    return status_cycle_slots
+
+async def auto_update_status_detailed(channel, messages):
+    """Función que actualiza automáticamente con tolerancia a conexiones lentas"""
+    scheduler = FixedRateScheduler(STATUS_UPDATE_INTERVAL, status_cycle_stats,
+                                   slots=get_status_cycle_slots(), name=f"Auto-update canal {channel.id}")
+    
+    async def cycle(update_count):
+        with tracer.span('update_cycle', track=f"canal {channel.id}", cycle=update_count):
+            await run_status_update_cycle(channel, messages, update_count)
+        profile_cycle_finished()
+    
+    try:
+        await scheduler.run(cycle)
+    
+    except asyncio.CancelledError:
+        logger.info(f"🛑 Auto-update PERSISTENTE cancelado para canal {channel.id}")
+    except Exception as e:
+        logger.error(f"❌ Error fatal en auto-update PERSISTENTE: {e}")
+    finally:
+        discord_edits.forget(messages)
+        # Limpiar el registro del canal
+        if channel.id in active_status_channels:
+            del active_status_channels[channel.id]
+        logger.info(f"🧹 Auto-update PERSISTENTE limpiado para canal {channel.id}")
+
+async def run_status_update_cycle(channel, messages, update_count):
+    """Un ciclo de auto-update: consulta todos los servidores y edita los mensajes del canal"""
+    track = f"canal {channel.id}"
+    logger.info("🔄 Auto-update PERSISTENTE #%d para canal %s", update_count, channel.id, extra={'event': 'cycle_start'})
+    
+    if STATUS_LAYOUT == 'compact':
+        await run_compact_update_cycle(channel, messages, update_count)
+        return
+    
+    # Mensaje de "actualizando" en el primer mensaje
+    if len(messages) > 0:
+        updating_embed = discord.Embed(
+            title="🔄 Actualizando servidores...",
+            description=f"Actualización #{update_count} - Obteniendo información persistente...",
+            color=0xffaa00
+        )
+        discord_edits.submit(messages[0], priority=EDIT_PRIORITY_PROGRESS, embed=updating_embed)
+    
+    # Obtener información actualizada de todos los servidores (PERSISTENTE)
+    servers = servers_for_guild(channel.guild)
+    servers_info = []
+    for i, server in enumerate(servers):
+        logger.info("🔄 Auto-update: procesando %s (%d/%d)", server['name'], i + 1, len(servers))
+        
+        # Actualizar mensaje de progreso
+        if len(messages) > 0:
+            updating_embed.description = f"Actualización #{update_count} - Procesando {server['name']} ({i+1}/{len(servers)})"
+            discord_edits.submit(messages[0], priority=EDIT_PRIORITY_PROGRESS, embed=updating_embed)
+        
+        server_info = await get_server_info_current(server)
+        servers_info.append(server_info)
+    
+    # Actualizar mensaje de resumen (primer mensaje)
+    if len(messages) > 0:
+        with tracer.span('embed_build', track=track, embed='resumen'):
+            status_embed = create_status_embed(servers_info)
+        status_embed.set_footer(
+            text=f"🔄 Auto-actualización PERSISTENTE #{update_count} | Próxima actualización en {STATUS_UPDATE_INTERVAL}s | {datetime.now().strftime('%H:%M:%S')}"
+        )
+        
+        discord_edits.submit(messages[0], change_key=summary_change_key(servers_info), embed=status_embed)
+    
+    # Actualizar mensajes de detalles (resto de mensajes)
+    for i, server_info in enumerate(servers_info):
+        if i + 1 < len(messages):  # +1 porque el primer mensaje es el resumen
+            with tracer.span('embed_build', track=track, embed=server_info.name):
+                match_embed = create_match_embed_improved(server_info)
+            discord_edits.submit(messages[i + 1], change_key=match_change_key(server_info), embed=match_embed)
+    
+    logger.info("✅ Auto-update PERSISTENTE #%d completado (ediciones: %s)", update_count, discord_edits.describe(),
+                extra={'event': 'cycle_done'})
+
+async def run_compact_update_cycle(channel, messages, update_count):
+    """Ciclo en layout compacto: sin ediciones de progreso, un edit por grupo de 10 embeds"""
+    track = f"canal {channel.id}"
+    
+    servers_info = []
+    snapshots = []
+    for server in servers_for_guild(channel.guild):
+        servers_info.append(await get_server_info_current(server))
+        # None si !removeserver lo descartó mientras se esperaba la consulta
+        snapshots.append(server_snapshots.get(snapshot_key(server)))
+    
+    with tracer.span('embed_build', track=track, embed='compacto'):
+        embeds = build_status_embeds(
+            servers_info, snapshots,
+            f"🔄 Auto-actualización PERSISTENTE #{update_count} | Próxima actualización en {STATUS_UPDATE_INTERVAL}s | {datetime.now().strftime('%H:%M:%S')}"
+        )
+    change_keys = [summary_change_key(servers_info)] + [match_change_key(info) for info in servers_info]
+    await sync_compact_status(channel, messages, embeds, track, change_keys)
+    
+    logger.info("✅ Auto-update PERSISTENTE #%d completado (%d mensajes, %d embeds)", update_count, len(messages),
+                len(embeds), extra={'event': 'cycle_done'})
+
+# ============= GATE A2S -> RCON =============
+# sv_matchinfojson es la consulta más cara: con datos A2S baratos y el snapshot anterior
+# se decide si puede haber cambiado algo antes de pedirlo.
+RCON_GATE = os.getenv('RCON_GATE', '1').lower() in ('1', 'true', 'yes')
+RCON_GATE_MAX_SKIP = int(os.getenv('RCON_GATE_MAX_SKIP', '600'))  # Segundos máximos sin RCON con jugadores conectados
+A2S_RULES = os.getenv('A2S_RULES', '0').lower() in ('1', 'true', 'yes')
+FINISHED_PERIOD_MARKERS = ('FULL TIME', 'FINISHED')
+
+rcon_gate_state = {}  # server_id -> {'players', 'map', 'rules', 'fetched_at'} de la última consulta RCON
+rcon_gate_stats = {'fetched': 0, 'skipped': 0}
+
+def rules_fingerprint(rules):
+    return hash(frozenset(rules.items())) if rules is not None else None
+
+def rcon_gate_decision(key, a2s_info, rules, previous_info):
+    """
+    Returns: (necesita_rcon, motivo). Si no hace falta, el llamador reutiliza el
+    match info anterior (partido terminado) o ninguno (servidor vacío).
+    """
+    if not RCON_GATE:
+        return True, 'gate desactivado'
+    if a2s_info['players'] == 0:
+        return False, 'sin jugadores'
+    
+    state = rcon_gate_state.get(key)
+    previous_match = previous_info.match_info if previous_info else None
+    if state is None or not previous_match:
+        return True, 'sin datos previos'
+    if time.time() - state['fetched_at'] >= RCON_GATE_MAX_SKIP:
+        return True, 'control periódico'
+    
+    period = (previous_match.get('period') or '').upper()
+    if not any(marker in period for marker in FINISHED_PERIOD_MARKERS):
+        return True, 'partido en juego'
+    if a2s_info['players'] != state['players'] or a2s_info['map_name'] != state['map']:
+        return True, 'cambió A2S'
+    if rules is not None and rules_fingerprint(rules) != state['rules']:
+        return True, 'cambiaron las reglas'
+    return False, 'partido terminado sin cambios'
+
+def record_rcon_fetch(key, a2s_info, rules):
+    rcon_gate_state[key] = {
+        'players': a2s_info['players'],
+        'map': a2s_info['map_name'],
+        'rules': rules_fingerprint(rules),
+        'fetched_at': time.time(),
+    }
+
+# 2. MEJORAR LA FUNCIÓN get_server_info_robust
+async def get_server_info_robust(server):
+    """Obtiene información completa del servidor con conexión ULTRA PERSISTENTE"""
+    with tracer.span('get_server_info', track=server.get('id', server.get('name', 'Unknown'))):
+        return await fetch_server_info(server)
+
+async def fetch_server_info(server):
+    """Consulta A2S + sv_matchinfojson y arma el ServerInfo"""
+    track = server.get('id', server.get('name', 'Unknown'))
+    log = server_logger(track)
+    
+    # Validar configuración del servidor (los agregados por una guild sin RCON propia son solo A2S)
+    if not server.get('rcon_ports') and 'rcon_password' not in server:
+        logger.error(f"❌ Servidor {server.get('name', 'Unknown')} sin puertos RCON definidos")
+        return ServerInfo(
+            name=server.get('name', 'Unknown'),
+            status="🔴 Error - Sin puertos RCON"
+        )
+    
+    try:
+        log.info("📡 Consultando servidor ULTRA ROBUSTO: %s (ID: %s)", server['name'], server.get('id', 'unknown'))
+        
+        # 1. Información básica con A2S_INFO (timeout aumentado)
+        with tracer.span('a2s_info', track=track):
+            a2s_info = await asyncio.to_thread(A2SQuery.query_server, server['ip'], server['port'])
+        
+        if not a2s_info:
+            log.warning("❌ A2S_INFO falló para %s", server['name'], extra={'event': 'a2s_error'})
+            return ServerInfo(
+                name=server['name'],
+                status="🔴 Offline"
+            )
+        
+        log.info("✅ A2S_INFO exitoso para %s: %s/%s", server['name'], a2s_info['players'], a2s_info['max_players'])
+        
+        return ServerInfo(
+            name=server['name'],
+            status="🟢 Online",
+            players=a2s_info['players'],
+            max_players=a2s_info['max_players'],
+            map_name=a2s_info['map_name'],
+            match_info=await fetch_match_details(server, a2s_info),
+            basic_info=a2s_info
+        )
+        
+    except Exception as e:
+        log.error("❌ Error obteniendo info ULTRA ROBUSTA de %s: %s", server['name'], e)
+        return ServerInfo(
+            name=server['name'],
+            status="🔴 Error General",
+        )
+
+async def fetch_match_details(server, a2s_info):
+    """
+    Match info (ya proyectado) para un servidor online, a partir de sus datos A2S.
+    Pasa por el gate: puede devolver el match info anterior o None sin tocar RCON.
+    """
+    track = server.get('id', server.get('name', 'Unknown'))
+    log = server_logger(track)
+    if not rcon_enabled(server):
+        return None  # Solo A2S
+    
+    # ¿Hace falta RCON? (servidor vacío o partido terminado sin cambios -> no)
+    rules = None
+    if A2S_RULES and a2s_info['players'] > 0:
+        with tracer.span('a2s_rules', track=track):
+            rules = await asyncio.to_thread(A2SQuery.query_rules, server['ip'], server['port'])
+    previous = server_snapshots.get(snapshot_key(server))
+    need_rcon, reason = rcon_gate_decision(track, a2s_info, rules, previous['info'] if previous else None)
+    if not need_rcon:
+        rcon_gate_stats['skipped'] += 1
+        log.info("🚦 RCON omitido para %s: %s", server['name'], reason, extra={'event': 'rcon_gate_skip'})
+        return previous['info'].match_info if previous and a2s_info['players'] > 0 else None
+    rcon_gate_stats['fetched'] += 1
+    
+    # Las consultas cercanas al mismo servidor comparten el match info ya proyectado
+    match_info = await rcon_single_flight.run((track, 'match_info'), lambda: fetch_projected_match_info(server))
+    if match_info:
+        record_rcon_fetch(track, a2s_info, rules)
+    return match_info
+
+async def fetch_projected_match_info(server):
+    """sv_matchinfojson parseado, sumado a las clasificaciones y proyectado (el JSON crudo se suelta acá)"""
+    track = server.get('id', server.get('name', 'Unknown'))
+    log = server_logger(track)
+    
+    # Información del partido con método ULTRA PERSISTENTE
+    with tracer.span('rcon_match_info', track=track):
+        match_result = await RCONManager.get_match_info_json_persistent(server, rcon_password_for(server))
+    
+    match_info = None
+    connection_details = match_result.get('connection_info', {})
+    
+    if match_result['success'] and match_result['data']:
+        log.info("📊 JSON PERSISTENTE obtenido para %s: %s caracteres en %.2fs", server['name'],
+                 connection_details.get('json_size', 0), match_result.get('total_time', 0))
+        
+        # SIEMPRE intentar parsear el JSON
+        with tracer.span('parse_match_info', track=track):
+            match_info = parse_match_info(match_result['data'], server.get('id', server['name']))
+        
+        if match_info:
+            leaderboards.record_events(server.get('id', server['name']), match_info['events'])
+            # Soltar el JSON crudo: el snapshot solo guarda la proyección compacta
+            match_info = project_match_info(match_info)
+            log.info("✅ Match info PERSISTENTE parseada: %s %s-%s %s (%s)", match_info['team_home'],
+                     match_info['goals_home'], match_info['goals_away'], match_info['team_away'], match_info['time_display'])
+        else:
+            log.warning("⚠️ No se pudo parsear match info para %s (JSON obtenido pero parsing falló)", server['name'])
+    else:
+        log.warning("⚠️ No se pudo obtener JSON para %s después de %.2fs: %s", server['name'],
+                    match_result.get('total_time', 0), match_result['error'])
+    
+    return match_info
+        
+# ============= SNAPSHOTS DE SERVIDORES =============
+SNAPSHOT_MAX_AGE = int(os.getenv('SNAPSHOT_MAX_AGE', '60'))  # Segundos antes de refrescar en segundo plano
+# Dos loops por servidor escriben en el mismo snapshot: A2S (rápido, barato) y RCON (detalle del partido).
+# Desactivados por defecto: con POLLING_LOOPS=1 cada servidor sondeado (incluidos los que agregan las
+# guilds) recibe un A2S_INFO cada A2S_POLL_INTERVAL segundos y un sv_matchinfojson cada RCON_POLL_INTERVAL.
+# Sin ellos los ciclos de auto-update refrescan el snapshot a demanda.
+POLLING_LOOPS = os.getenv('POLLING_LOOPS', '0').lower() in ('1', 'true', 'yes')
+A2S_POLL_INTERVAL = float(os.getenv('A2S_POLL_INTERVAL', '5'))
+RCON_POLL_INTERVAL = float(os.getenv('RCON_POLL_INTERVAL', '60'))
+A2S_FIELDS = ('status', 'players', 'max_players', 'map_name', 'basic_info')
+
+server_snapshots = {}        # server_id -> {'info': ServerInfo, 'updated_at': float, 'version': int, 'field_times': {campo: float}}
+snapshot_refresh_tasks = {}  # server_id -> asyncio.Task del refresco en curso
+snapshot_version = 0         # Crece con cada cambio de cualquier snapshot (base de los ETags)
+polling_tasks = {}           # (server_id, 'a2s'|'rcon') -> asyncio.Task
+
+def snapshot_key(server):
+    return server.get('id', server['name'])
+
+def bump_snapshot_version(snapshot):
+    global snapshot_version
+    snapshot_version += 1
+    snapshot['version'] = snapshot_version
+
+def update_snapshot(server, fields):
+    """
+    Escribe `fields` (atributos de ServerInfo) en el snapshot del servidor conservando el resto,
+    con timestamp por campo. La versión solo cambia si algún valor cambió.
+    Returns: el ServerInfo resultante
+    """
+    key = snapshot_key(server)
+    previous = server_snapshots.get(key)
+    now = time.time()
+    
+    if previous is None:
+        values = {'name': server['name'], 'status': "🔴 Offline", 'address': f"{server['ip']}:{server['port']}"}
+        field_times = {}
+    else:
+        values = {slot: getattr(previous['info'], slot) for slot in ServerInfo.__slots__}
+        field_times = dict(previous['field_times'])
+    changed = previous is None or any(values.get(field) != value for field, value in fields.items())
+    values.update(fields)
+    field_times.update((field, now) for field in fields)
+    
+    snapshot = {
+        'info': ServerInfo(**values),
+        'updated_at': now,
+        'field_times': field_times,
+    }
+    if changed:
+        bump_snapshot_version(snapshot)
+    else:
+        snapshot['version'] = previous['version']
+    server_snapshots[key] = snapshot
+    if previous is not None and changed:
+        publish_snapshot_deltas(key, previous['info'], snapshot['info'])
+    return snapshot['info']
+
+async def refresh_server_snapshot(server):
+    """Consulta el servidor en vivo (A2S + RCON) y guarda el resultado como último snapshot"""
+    server_info = await get_server_info_robust(server)
+    return update_snapshot(server, {slot: getattr(server_info, slot) for slot in ServerInfo.__slots__ if slot != 'address'})
+
+async def a2s_poll_loop(server):
+    """Loop rápido: estado online/offline, jugadores y mapa"""
+    key = snapshot_key(server)
+    while True:
+        try:
+            with tracer.span('a2s_poll', track=key):
+                a2s_info = await asyncio.to_thread(A2SQuery.query_server, server['ip'], server['port'])
+            if a2s_info:
+                previous = server_snapshots.get(key)
+                if previous and previous['info'].basic_info is None:
+                    # El servidor volvió: recalentar sus sesiones RCON antes del próximo sondeo
+                    for port in server.get('rcon_ports', []) if rcon_enabled(server) else ():
+                        if (server['ip'], port) in rcon_pool.known_hosts:
+                            asyncio.create_task(warm_rcon_sessions(server['ip'], port, rcon_password_for(server)))
+                update_snapshot(server, {
+                    'status': "🟢 Online",
+                    'players': a2s_info['players'],
+                    'max_players': a2s_info['max_players'],
+                    'map_name': a2s_info['map_name'],
+                    'basic_info': a2s_info,
+                })
+            else:
+                update_snapshot(server, {
+                    'status': "🔴 Offline", 'players': 0, 'max_players': 0,
+                    'map_name': "N/A", 'basic_info': None, 'match_info': None,
+                })
+        except Exception as e:
+            server_logger(key).error("❌ Error en loop A2S de %s: %s", server['name'], e)
+        await asyncio.sleep(A2S_POLL_INTERVAL)
+
+async def rcon_poll_loop(server):
+    """Loop lento: detalle del partido, solo para servidores que el loop A2S ve online"""
+    key = snapshot_key(server)
+    while True:
+        try:
+            snapshot = server_snapshots.get(key)
+            a2s_info = snapshot['info'].basic_info if snapshot else None
+            if a2s_info and rcon_enabled(server):
+                with tracer.span('rcon_poll', track=key):
+                    match_info = await fetch_match_details(server, a2s_info)
+                update_snapshot(server, {'match_info': match_info})
+        except Exception as e:
+            server_logger(key).error("❌ Error en loop RCON de %s: %s", server['name'], e)
+        await asyncio.sleep(RCON_POLL_INTERVAL)
+
+def start_polling_loops():
+    if not POLLING_LOOPS:
+        return
+    for server in server_registry.polled_servers():
+        key = snapshot_key(server)
+        for kind, loop in (('a2s', a2s_poll_loop), ('rcon', rcon_poll_loop)):
+            task = polling_tasks.get((key, kind))
+            if task is None or task.done():
+                polling_tasks[(key, kind)] = asyncio.create_task(loop(server))
+
+def polling_active(server):
+    task = polling_tasks.get((snapshot_key(server), 'rcon'))
+    return task is not None and not task.done()
+
+def stop_server_tasks(server):
+    """
+    Cancela loops, vigilante y refresco en curso de un servidor que ninguna guild vigila y descarta
+    su snapshot y el estado por dirección (gate, esquema, sesiones RCON, salud, hedges)
+    """
+    key = snapshot_key(server)
+    for task in (polling_tasks.pop((key, 'a2s'), None), polling_tasks.pop((key, 'rcon'), None),
+                 live_watch_tasks.pop(key, None), snapshot_refresh_tasks.pop(key, None)):
+        if task is not None:
+            task.cancel()  # Un refresco cancelado ya no vuelve a crear el snapshot
+    server_snapshots.pop(key, None)
+    rcon_gate_state.pop(key, None)
+    schema_plans.pop(key, None)
+    log_receiver.last_packet_at.pop(key, None)
+    for port in (server['port'], *server.get('rcon_ports', ())):
+        rcon_pool.evict(server['ip'], port)
+        rcon_hedge_budget.forget((server['ip'], port))
+        for kind in HEALTH_TIMEOUT_LIMITS:
+            server_health.pop((server['ip'], port, kind), None)
+    bump_snapshot_version({})  # /servers cambia aunque ningún snapshot lo haga
+
+def schedule_snapshot_refresh(server, max_age=SNAPSHOT_MAX_AGE):
+    """
+    Lanza un refresco en segundo plano si el snapshot tiene más de `max_age` segundos.
+    Si ya hay un refresco en curso para el servidor, devuelve esa misma tarea.
+    Returns: asyncio.Task o None si el snapshot todavía es válido
+    """
+    key = snapshot_key(server)
+    task = snapshot_refresh_tasks.get(key)
+    if task and not task.done():
+        return task
+    
+    snapshot = server_snapshots.get(key)
+    if snapshot and time.time() - snapshot['updated_at'] < max_age:
+        return None
+    
+    task = asyncio.create_task(refresh_server_snapshot(server))
+    snapshot_refresh_tasks[key] = task
+    return task
+
+def server_info_for(server, server_info):
+    """El ServerInfo compartido con el nombre que le da la guild a ese servidor"""
+    if server_info.name == server['name']:
+        return server_info
+    values = {slot: getattr(server_info, slot) for slot in ServerInfo.__slots__}
+    values['name'] = server['name']
+    return ServerInfo(**values)
+
+async def wait_snapshot_refresh(server, task):
+    """Espera el refresco; si se canceló porque el servidor dejó de vigilarse, lo da por offline"""
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if not task.cancelled():
+            raise  # Cancelaron a quien espera, no al refresco
+        return ServerInfo(name=server['name'], status="🔴 Offline", address=f"{server['ip']}:{server['port']}")
+
+async def get_server_info_live(server):
+    """Fuerza datos nuevos, reutilizando el refresco en curso si lo hay"""
+    return server_info_for(server, await wait_snapshot_refresh(server, schedule_snapshot_refresh(server, max_age=0)))
+
+async def get_server_info_current(server):
+    """
+    Con los loops de sondeo activos el snapshot ya está al día. Si no, reutiliza un
+    snapshot reciente o el refresco en curso (otro canal o un !status ya lo pidió)
+    y solo consulta en vivo si no hay ninguno.
+    """
+    snapshot = server_snapshots.get(snapshot_key(server))
+    if snapshot and polling_active(server):
+        return server_info_for(server, snapshot['info'])
+    task = schedule_snapshot_refresh(server, max_age=STATUS_CYCLE_REUSE_AGE)
+    if task is None:
+        return server_info_for(server, snapshot['info'])
+    return server_info_for(server, await wait_snapshot_refresh(server, task))
+
+def format_snapshot_age(age_seconds):
+    age_seconds = max(0, int(age_seconds))
+    if age_seconds < 60:
+        return f"{age_seconds} s"
+    return f"{age_seconds // 60} min {age_seconds % 60} s"
+
+def add_snapshot_age_footer(embed, snapshot):
+    """Agrega al footer cuánto hace que se obtuvieron los datos (estado A2S y partido por separado)"""
+    if snapshot is None:
+        return embed  # Servidor quitado mientras se armaba el mensaje
+    now = time.time()
+    field_times = snapshot['field_times']
+    a2s_at = field_times.get('players', snapshot['updated_at'])
+    match_at = field_times.get('match_info')
+    if match_at is not None and abs(a2s_at - match_at) >= A2S_POLL_INTERVAL:
+        age_text = (f"📦 Estado de hace {format_snapshot_age(now - a2s_at)} · "
+                    f"partido de hace {format_snapshot_age(now - match_at)}")
+    else:
+        age_text = f"📦 Datos de hace {format_snapshot_age(now - snapshot['updated_at'])}"
+    footer_text = embed.footer.text if embed.footer else None
+    embed.set_footer(text=f"{footer_text} | {age_text}" if footer_text else age_text)
+    return embed
+
+# ============= NOTIFICACIONES DE GOL EN VIVO =============
+# Mientras un partido está en juego se sondea una señal barata de marcador cada pocos segundos;
+# solo cuando cambia se pide el sv_matchinfojson completo y se anuncian los goles nuevos.
+# Desactivado por defecto: con LIVE_GOAL_ALERTS=1 hay un vigilante por servidor sondeado que, durante el
+# partido, pide el match info cada LIVE_FULL_FETCH_INTERVAL segundos (o LIVE_SCORE_COMMAND cada LIVE_POLL_INTERVAL)
+LIVE_GOAL_ALERTS = os.getenv('LIVE_GOAL_ALERTS', '0').lower() in ('1', 'true', 'yes')
+LIVE_POLL_INTERVAL = float(os.getenv('LIVE_POLL_INTERVAL', '5'))    # Segundos entre sondeos durante el partido
+LIVE_IDLE_INTERVAL = float(os.getenv('LIVE_IDLE_INTERVAL', '15'))   # Segundos entre chequeos sin partido en juego
+LIVE_PERIODS = ('FIRST HALF', 'SECOND HALF')
+# Comando RCON barato cuya salida incluye el marcador (p. ej. "2 - 1"): con él, el sv_matchinfojson
+# completo solo se pide cuando cambia el marcador. Sin definir, durante el partido se refresca el
+# snapshot completo a lo sumo cada LIVE_FULL_FETCH_INTERVAL segundos (además del loop RCON).
+LIVE_SCORE_COMMAND = os.getenv('LIVE_SCORE_COMMAND', '')
+LIVE_SCORE_PATTERN = re.compile(os.getenv('LIVE_SCORE_PATTERN', r'(\d+)\s*[-:]\s*(\d+)'))
+LIVE_FULL_FETCH_INTERVAL = float(os.getenv('LIVE_FULL_FETCH_INTERVAL', '10'))
+
+live_watch_tasks = {}  # server_id -> asyncio.Task del vigilante en vivo
+
+def goal_identity(goal):
+    # Sin el minuto: el gol aplicado desde el log UDP (minuto estimado) y el mismo gol
+    # confirmado después por sv_matchinfojson tienen que contar como uno solo
+    return (goal.get('team'), goal.get('scorer_name'))
+
+def unseen_goals(goals, known):
+    """Goles de `goals` que exceden lo contado en `known` (Counter por goal_identity); los suma a `known`"""
+    seen = Counter()
+    fresh = []
+    for goal in goals:
+        identity = goal_identity(goal)
+        seen[identity] += 1
+        if seen[identity] > known[identity]:
+            known[identity] += 1
+            fresh.append(goal)
+    return fresh
+
+def match_score(match_info):
+    return (match_info.get('goals_home'), match_info.get('goals_away'))
+
+async def poll_live_score(server, rcon_port):
+    """Marcador (local, visitante) desde LIVE_SCORE_COMMAND, o None si no se pudo leer"""
+    result = await RCONManager.execute_command_persistent(
+        server['ip'], rcon_port, rcon_password_for(server), LIVE_SCORE_COMMAND, max_attempts=1
+    )
+    if not result['success']:
+        return None
+    match = LIVE_SCORE_PATTERN.search(result['response'])
+    if not match:
+        return None
+    return (int(match.group(1)), int(match.group(2)))
+
+def create_goal_embed(server_info, goal):
+    match_info = server_info.match_info
+    team_name = match_info['team_home'] if goal['team'] == 'home' else match_info['team_away']
+    
+    description = f"**{goal['scorer_name']}** ({goal['minute']})"
+    if goal.get('assist_name'):
+        description += f"\n🅰️ Asistencia: {goal['assist_name']}"
     
+    embed = discord.Embed(
+        title=f"⚽ ¡GOL de {team_name}!",
+        description=description,
+        color=0x00ff00,
+        timestamp=datetime.now()
+    )
+    embed.add_field(
+        name=f"🏟️ {server_info.name}",
+        value=f"{match_info['team_home']} **{match_info['goals_home']} - {match_info['goals_away']}** {match_info['team_away']}",
+        inline=False
+    )
     return embed
 
-def create_status_embed(servers_info):
-    """Crea el embed de estado general de todos los servidores"""
-    embed = discord.Embed(
-        title="⚽ Estado Servidores IOSoccer",
-        description="Información en tiempo real con Match Info JSON",
-        color=0x00ff00,
-        timestamp=datetime.now()
-    )
-    
-    online_count = 0
-    total_players = 0
-    active_matches = 0
+async def announce_goals(server, server_info, goals):
+    """Publica cada gol nuevo en los canales con auto-update activo de las guilds que vigilan el servidor"""
+    watching = server_registry.guild_ids_watching(snapshot_key(server))
+    channels = []
+    for entry in list(active_status_channels.values()):
+        channel = entry.get('channel')
+        if channel is None:
+            continue
+        guild_id = str(channel.guild.id) if channel.guild else None
+        if guild_id not in server_registry.guilds:
+            guild_id = None  # La guild usa la lista por defecto
+        if guild_id in watching:
+            channels.append(channel)
+    
+    for goal in goals:
+        logger.info("⚽ GOL en %s: %s (%s)", server_info.name, goal['scorer_name'], goal['minute'], extra={'event': 'live_goal'})
+        for channel in channels:
+            embed = create_goal_embed(server_info_for(entry_for_channel(channel, server), server_info), goal)
+            try:
+                with tracer.span('discord_send', track=f"canal {channel.id}", message='gol'):
+                    await channel.send(embed=embed)
+            except Exception as e:
+                logger.error(f"❌ Error anunciando gol en canal {channel.id}: {e}")
+
+async def live_match_watcher(server):
+    """Vigila un servidor: sondeo rápido durante el partido, chequeo lento el resto del tiempo"""
+    key = snapshot_key(server)
+    announced = None   # Goles ya vistos del partido en curso
+    last_score = None
+    rcon_port = None
+    
+    while True:
+        try:
+            snapshot = server_snapshots.get(key)
+            match_info = snapshot['info'].match_info if snapshot else None
+            
+            if not active_status_channels or not match_info or match_info.get('period') not in LIVE_PERIODS:
+                # Nadie a quien avisar o no hay partido en juego
+                announced = None
+                last_score = None
+                await asyncio.sleep(LIVE_IDLE_INTERVAL)
+                continue
+            
+            if announced is None:
+                # No anunciar los goles que ya estaban al empezar a vigilar
+                announced = Counter(goal_identity(goal) for goal in match_info.get('goals_detail', ()))
+                last_score = match_score(match_info)
+            
+            pushed = log_receiver.is_streaming(key)
+            fetch = False
+            if pushed:
+                # Con logs UDP no hace falta sondear: los goles y períodos ya vienen aplicados al snapshot.
+                # sv_matchinfojson solo para la reconciliación periódica (si no la hace ya el loop RCON)
+                woke = await log_receiver.wait_for_event(key, LOG_RECONCILE_INTERVAL)
+                fetch = not woke and not polling_active(server)
+            elif LIVE_SCORE_COMMAND and rcon_enabled(server):
+                if rcon_port is None:
+                    port_result = await RCONManager.find_working_rcon_port_persistent(server, rcon_password_for(server))
+                    rcon_port = port_result['port'] if port_result['success'] else None
+                if rcon_port is not None:
+                    with tracer.span('live_score', track=key):
+                        score = await poll_live_score(server, rcon_port)
+                    if score is None:
+                        rcon_port = None  # Redescubrir el puerto en el próximo sondeo
+                    # Solo un marcador distinto justifica el sv_matchinfojson completo
+                    fetch = score is not None and score != last_score
+            elif rcon_enabled(server):
+                # Sin señal barata: match info completo, acotado a uno cada LIVE_FULL_FETCH_INTERVAL
+                # (contando los refrescos del loop RCON, que escriben el mismo campo)
+                fetched_at = snapshot['field_times'].get('match_info', 0)
+                fetch = time.time() - fetched_at >= LIVE_FULL_FETCH_INTERVAL
+            
+            if fetch:
+                server_info = await get_server_info_live(server)
+            else:
+                # Sin cambios (o solo A2S) no se agrega RCON: se leen los goles del snapshot,
+                # que los loops de sondeo (o un refresco al ritmo normal) mantienen al día
+                if not polling_active(server):
+                    schedule_snapshot_refresh(server, max_age=RCON_POLL_INTERVAL)
+                snapshot = server_snapshots.get(key)
+                server_info = snapshot['info'] if snapshot else None
+            
+            if server_info is not None and server_info.match_info:
+                last_score = match_score(server_info.match_info)
+                new_goals = unseen_goals(server_info.match_info.get('goals_detail', ()), announced)
+                if new_goals:
+                    await announce_goals(server, server_info, new_goals)
+            
+            if not pushed or fetch:
+                await asyncio.sleep(LIVE_POLL_INTERVAL)
+        
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error en vigilante en vivo de {server.get('name', key)}: {e}")
+            await asyncio.sleep(LIVE_IDLE_INTERVAL)
+
+def entry_for_channel(channel, server):
+    """La entrada de la guild del canal para el servidor (con su nombre), o el server compartido"""
+    key = snapshot_key(server)
+    return next((entry for entry in servers_for_guild(channel.guild) if snapshot_key(entry) == key), server)
+
+def start_live_watchers():
+    if not LIVE_GOAL_ALERTS:
+        return
+    for server in server_registry.polled_servers():
+        key = snapshot_key(server)
+        task = live_watch_tasks.get(key)
+        if task is None or task.done():
+            live_watch_tasks[key] = asyncio.create_task(live_match_watcher(server))
+
+# ============= RECEPTOR DE LOGS UDP (logaddress_add) =============
+# Los servidores Source envían sus logs por UDP: joins/leaves, goles y cambios de período se
+# aplican directo al snapshot; sv_matchinfojson queda para la reconciliación periódica.
+LOG_LISTEN_PORT = int(os.getenv('LOG_LISTEN_PORT', '0'))       # 0 = receptor desactivado
+LOG_LISTEN_HOST = os.getenv('LOG_LISTEN_HOST', '0.0.0.0')
+LOG_PUBLIC_ADDRESS = os.getenv('LOG_PUBLIC_ADDRESS')            # ip:puerto que los servidores usan para logaddress_add
+LOG_SECRET = os.getenv('LOG_SECRET')                            # sv_logsecret (opcional)
+LOG_STREAM_TIMEOUT = float(os.getenv('LOG_STREAM_TIMEOUT', '120'))   # Sin paquetes por este tiempo = vuelve el sondeo
+LOG_RECONCILE_INTERVAL = float(os.getenv('LOG_RECONCILE_INTERVAL', '60'))  # RCON de control con logs activos
+
+LOG_PACKET_HEADER = b'\xff\xff\xff\xff'
+LOG_TIMESTAMP_LENGTH = len('L 01/01/2024 - 00:00:00: ')
+LOG_PLAYER_RE = re.compile(r'"(?P<name>.*?)<(?P<uid>-?\d+)><(?P<steam>[^>]*)><(?P<team>[^>]*)>" (?P<action>[a-z ]+?)(?: "(?P<arg>[^"]*)"|$| \(|,)')
+LOG_WORLD_RE = re.compile(r'World triggered "(?P<arg>[^"]+)"')
+LOG_GOAL_TRIGGERS = {'goal', 'goal_scored'}
+# World triggered "<evento>" (normalizado a minúsculas con '_') -> período del match info
+LOG_PERIOD_TRIGGERS = {
+    'first_half': 'FIRST HALF', 'kick_off': 'FIRST HALF',
+    'half_time': 'HALF TIME',
+    'second_half': 'SECOND HALF',
+    'full_time': 'FULL TIME', 'match_end': 'FULL TIME', 'game_over': 'FULL TIME',
+}
+
+def log_period(trigger):
+    return LOG_PERIOD_TRIGGERS.get(re.sub(r'[\s\-]+', '_', trigger.strip().lower()))
+
+def log_team_side(team, match_info):
+    """'home'/'away' a partir del equipo del log (lado o nombre del equipo), o None"""
+    team = (team or '').strip().lower()
+    for side in ('home', 'away'):
+        if team == side or team == (match_info.get(f"team_{side}") or '').lower():
+            return side
+    return None
+
+def parse_log_packet(data, secret=None):
+    """
+    Extrae la línea de un paquete de log Source: FF FF FF FF 'R' "L ..." o 'S' <secreto> "L ...".
+    Returns: str sin timestamp, o None si el paquete no es válido o el secreto no coincide
+    """
+    if not data.startswith(LOG_PACKET_HEADER) or len(data) < 6:
+        return None
+    kind = data[4:5]
+    body = data[5:]
+    if kind == b'S':
+        if secret is None:
+            return None
+        secret_bytes = secret.encode('utf-8')
+        if not body.startswith(secret_bytes):
+            return None
+        body = body[len(secret_bytes):]
+    elif kind != b'R' or secret is not None:
+        return None
+    line = body.rstrip(b'\x00\r\n').decode('utf-8', errors='replace')
+    if not line.startswith('L '):
+        return None
+    return line[LOG_TIMESTAMP_LENGTH:]
+
+def parse_log_line(line):
+    """
+    Clasifica una línea de log (sin timestamp).
+    Returns: {'type': 'join'|'leave'|'goal'|'world', ...} o None si no interesa
+    """
+    if line.startswith('World triggered'):
+        match = LOG_WORLD_RE.match(line)
+        return {'type': 'world', 'event': match.group('arg')} if match else None
+    
+    if not line.startswith('"'):
+        return None
+    match = LOG_PLAYER_RE.match(line)
+    if not match:
+        return None
+    
+    action = match.group('action')
+    steam_id = match.group('steam')
+    if action == 'entered the game':
+        event_type = 'join'
+    elif action == 'disconnected':
+        event_type = 'leave'
+    elif action == 'triggered' and (match.group('arg') or '').lower() in LOG_GOAL_TRIGGERS:
+        event_type = 'goal'
+    else:
+        return None
+    return {
+        'type': event_type,
+        'name': match.group('name'),
+        'steam_id': steam_id,
+        'team': match.group('team'),
+        'bot': steam_id in NON_PLAYER_STEAM_IDS,
+    }
+
+class LogReceiverProtocol(asyncio.DatagramProtocol):
+    def __init__(self, receiver):
+        self.receiver = receiver
+
+    def datagram_received(self, data, addr):
+        self.receiver.handle_packet(data, addr)
+
+class LogReceiver:
+    """Escucha logs UDP de los servidores y alimenta snapshots y vigilantes en vivo"""
+
+    def __init__(self):
+        self.transport = None
+        self.servers_by_address = {}  # (ip, puerto) -> server
+        self.servers_by_ip = {}       # ip -> [server] (si el puerto de origen no coincide)
+        self.last_packet_at = {}      # server_id -> time.monotonic()
+        self._signals = {}            # server_id -> asyncio.Event
+        self.packets = 0
+        self.events = 0
+        self.dropped = 0
+
+    def set_servers(self, servers):
+        self.servers_by_address = {(server['ip'], server['port']): server for server in servers}
+        self.servers_by_ip = {}
+        for server in servers:
+            self.servers_by_ip.setdefault(server['ip'], []).append(server)
+
+    async def start(self, host, port):
+        self.set_servers(server_registry.polled_servers())
+        
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: LogReceiverProtocol(self), local_addr=(host, port)
+        )
+        logger.info(f"📥 Receptor de logs UDP escuchando en {host}:{port}")
+
+    def server_for(self, addr):
+        server = self.servers_by_address.get(addr)
+        if server is None:
+            candidates = self.servers_by_ip.get(addr[0], [])
+            server = candidates[0] if len(candidates) == 1 else None
+        return server
+
+    def is_streaming(self, key):
+        last = self.last_packet_at.get(key)
+        return last is not None and time.monotonic() - last < LOG_STREAM_TIMEOUT
+
+    def _signal(self, key):
+        signal = self._signals.get(key)
+        if signal is None:
+            signal = asyncio.Event()
+            self._signals[key] = signal
+        return signal
+
+    async def wait_for_event(self, key, timeout):
+        """Espera un gol/cambio de estado del servidor o hasta `timeout` segundos. Returns: True si hubo evento"""
+        signal = self._signal(key)
+        try:
+            await asyncio.wait_for(signal.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            signal.clear()
+        return True
+
+    def handle_packet(self, data, addr):
+        server = self.server_for(addr)
+        line = parse_log_packet(data, LOG_SECRET) if server is not None else None
+        if line is None:
+            self.dropped += 1
+            return
+        
+        key = snapshot_key(server)
+        self.packets += 1
+        self.last_packet_at[key] = time.monotonic()
+        
+        event = parse_log_line(line)
+        if event is None:
+            return
+        self.events += 1
+        
+        if event['type'] in ('join', 'leave'):
+            if not event['bot']:
+                self.apply_player_delta(server, 1 if event['type'] == 'join' else -1)
+                live_feed.publish(key, f"player_{event['type']}", name=event['name'], team=event['team'])
+        else:
+            logger.info("📥 Log %s en %s: %.120s", event['type'], server['name'], line, extra={'event': 'log_event'})
+            if event['type'] == 'goal':
+                applied = self.apply_goal(server, event)
+            else:
+                applied = self.apply_period(server, event['event'])
+            if applied:
+                self._signal(key).set()
+
+    @staticmethod
+    def apply_goal(server, event):
+        """
+        Suma el gol al match info del snapshot (marcador y detalle, minuto estimado con el reloj
+        del partido). Si no se puede ubicar el equipo queda para la reconciliación por RCON.
+        Returns: True si se aplicó
+        """
+        snapshot = server_snapshots.get(snapshot_key(server))
+        match_info = snapshot['info'].match_info if snapshot else None
+        side = log_team_side(event['team'], match_info) if match_info else None
+        if side is None:
+            return False
+        
+        elapsed = time.time() - snapshot['field_times'].get('match_info', snapshot['updated_at'])
+        updated = dict(match_info)
+        updated[f"goals_{side}"] = (match_info.get(f"goals_{side}") or 0) + 1
+        updated['goals_detail'] = tuple(match_info.get('goals_detail') or ()) + ({
+            'minute': seconds_to_minutes((match_info.get('time_seconds') or 0) + elapsed),
+            'team': side,
+            'scorer_name': event['name'],
+            'assist_name': None,
+        },)
+        update_snapshot(server, {'match_info': updated})
+        return True
+
+    @staticmethod
+    def apply_period(server, trigger):
+        """Cambio de período desde un World triggered conocido. Returns: True si se aplicó"""
+        period = log_period(trigger)
+        snapshot = server_snapshots.get(snapshot_key(server))
+        match_info = snapshot['info'].match_info if snapshot else None
+        if period is None or not match_info or match_info.get('period') == period:
+            return False
+        update_snapshot(server, {'match_info': dict(match_info, period=period)})
+        return True
+
+    @staticmethod
+    def apply_player_delta(server, delta):
+        """Join/leave del log: nuevo conteo de jugadores escrito como cualquier otro campo del snapshot"""
+        snapshot = server_snapshots.get(snapshot_key(server))
+        if not snapshot:
+            return
+        server_info = snapshot['info']
+        players = max(0, server_info.players + delta)
+        if server_info.max_players:
+            players = min(players, server_info.max_players)
+        update_snapshot(server, {'players': players})
+
+    def describe(self):
+        streaming = sum(1 for key in self.last_packet_at if self.is_streaming(key))
+        return (f"{self.packets} paquetes, {self.events} eventos, {self.dropped} descartados, "
+                f"{streaming}/{len(self.servers_by_address)} servidores transmitiendo")
+
+log_receiver = LogReceiver()
+
+async def register_log_address(server):
+    """Pide al servidor que envíe sus logs a LOG_PUBLIC_ADDRESS"""
+    if not rcon_enabled(server):
+        return False
+    password = rcon_password_for(server)
+    port_result = await RCONManager.find_working_rcon_port_persistent(server, password)
+    if not port_result['success']:
+        logger.warning(f"⚠️ {server['name']}: sin puerto RCON para logaddress_add")
+        return False
+    
+    commands_to_run = ['log on', f"logaddress_add {LOG_PUBLIC_ADDRESS}"]
+    if LOG_SECRET:
+        commands_to_run.insert(0, f"sv_logsecret {LOG_SECRET}")
+    for command in commands_to_run:
+        await RCONManager.execute_command_persistent(
+            server['ip'], port_result['port'], password, command, max_attempts=2
+        )
+    logger.info(f"📥 {server['name']}: logs enviados a {LOG_PUBLIC_ADDRESS}")
+    return True
+
+async def start_log_receiver():
+    if not LOG_LISTEN_PORT or log_receiver.transport is not None:
+        return
+    try:
+        await log_receiver.start(LOG_LISTEN_HOST, LOG_LISTEN_PORT)
+    except OSError as e:
+        logger.error(f"❌ No se pudo abrir el receptor de logs en {LOG_LISTEN_HOST}:{LOG_LISTEN_PORT}: {e}")
+        return
+    
+    if LOG_PUBLIC_ADDRESS:
+        for server in server_registry.polled_servers():
+            asyncio.create_task(register_log_address(server))
+    else:
+        logger.warning("⚠️ LOG_PUBLIC_ADDRESS sin definir: configurar logaddress_add en los servidores a mano")
+
+# ============= API HTTP DE SOLO LECTURA =============
+# Sirve los snapshots en JSON sin tocar RCON. ETag = época de arranque + versión del snapshot,
+# así los clientes pueden sondear con If-None-Match y recibir 304 (y un reinicio, que vuelve
+# las versiones a 0, no confunde un ETag viejo con uno nuevo).
+HTTP_API_PORT = int(os.getenv('HTTP_API_PORT', '0'))   # 0 = API desactivada
+HTTP_API_HOST = os.getenv('HTTP_API_HOST', '0.0.0.0')
+
+http_api_runner = None
+api_body_cache = {}  # ruta -> (etag, bytes) de la última respuesta serializada
+API_ETAG_EPOCH = os.urandom(4).hex()  # Distinta en cada arranque
+
+def make_etag(*parts):
+    return '"' + '-'.join(str(part) for part in (API_ETAG_EPOCH,) + parts) + '"'
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match: '*' o lista separada por comas; comparación débil (se ignora W/)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def server_info_to_dict(server_id, snapshot):
+    server_info = snapshot['info']
+    match_info = server_info.match_info
+    return {
+        'id': server_id,
+        'name': server_info.name,
+        'status': server_info.status,
+        'players': server_info.players,
+        'max_players': server_info.max_players,
+        'map': server_info.map_name,
+        'updated_at': snapshot['updated_at'],
+        'field_times': snapshot['field_times'],
+        'match': {
+            'period': match_info.get('period'),
+            'time_display': match_info.get('time_display'),
+            'team_home': match_info.get('team_home'),
+            'team_away': match_info.get('team_away'),
+            'goals_home': match_info.get('goals_home'),
+            'goals_away': match_info.get('goals_away'),
+        } if match_info else None,
+    }
+
+def api_response(request, etag, build_payload):
+    """Respuesta JSON con ETag; 304 si el cliente ya tiene esta versión"""
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return web.Response(status=304, headers=headers)
+    
+    cached = api_body_cache.get(request.path)
+    if cached is None or cached[0] != etag:
+        cached = (etag, json.dumps(build_payload(), ensure_ascii=False).encode('utf-8'))
+        api_body_cache[request.path] = cached
+    return web.Response(body=cached[1], content_type='application/json', headers=headers)
+
+def api_snapshot(request):
+    server_id = request.match_info['server_id']
+    snapshot = server_snapshots.get(server_id)
+    if snapshot is None:
+        raise web.HTTPNotFound(text=json.dumps({'error': f"Servidor {server_id} sin snapshot"}),
+                               content_type='application/json')
+    return server_id, snapshot
+
+async def api_servers(request):
+    etag = make_etag(snapshot_version)
+    return api_response(request, etag, lambda: {
+        'servers': [server_info_to_dict(snapshot_key(server), server_snapshots[snapshot_key(server)])
+                    for server in server_registry.polled_servers() if snapshot_key(server) in server_snapshots],
+    })
+
+async def api_server(request):
+    server_id, snapshot = api_snapshot(request)
+    return api_response(request, make_etag(server_id, snapshot['version']),
+                        lambda: server_info_to_dict(server_id, snapshot))
+
+async def api_server_match(request):
+    server_id, snapshot = api_snapshot(request)
+    return api_response(request, make_etag(server_id, snapshot['version']), lambda: {
+        'id': server_id,
+        'updated_at': snapshot['updated_at'],
+        'match': snapshot['info'].match_info,
+    })
+
+def create_http_api():
+    app = web.Application()
+    app.router.add_get('/servers', api_servers)
+    app.router.add_get('/servers/{server_id}', api_server)
+    app.router.add_get('/servers/{server_id}/match', api_server_match)
+    app.router.add_get('/events', api_events_sse)
+    app.router.add_get('/ws', api_events_ws)
+    return app
+
+async def start_http_api():
+    global http_api_runner
+    if not HTTP_API_PORT or http_api_runner is not None:
+        return
+    runner = web.AppRunner(create_http_api())
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, HTTP_API_HOST, HTTP_API_PORT).start()
+    except OSError as e:
+        logger.error(f"❌ No se pudo abrir la API HTTP en {HTTP_API_HOST}:{HTTP_API_PORT}: {e}")
+        await runner.cleanup()
+        return
+    http_api_runner = runner
+    logger.info(f"🌐 API HTTP escuchando en http://{HTTP_API_HOST}:{HTTP_API_PORT}/servers")
+
+# ============= FEED EN VIVO (SSE / WEBSOCKET) =============
+# Deltas de partido empujados a los suscriptores apenas el bot los observa.
+# Cada suscriptor tiene una cola acotada: si no lee a tiempo se descartan los eventos más viejos.
+LIVE_FEED_QUEUE_SIZE = int(os.getenv('LIVE_FEED_QUEUE_SIZE', '100'))
+LIVE_FEED_HEARTBEAT = float(os.getenv('LIVE_FEED_HEARTBEAT', '15'))  # Segundos entre pings a clientes inactivos
+
+class FeedSubscriber:
+    __slots__ = ('queue', 'ready', 'server_id', 'dropped')
+
+    def __init__(self, server_id=None):
+        self.queue = deque(maxlen=LIVE_FEED_QUEUE_SIZE)
+        self.ready = asyncio.Event()
+        self.server_id = server_id
+        self.dropped = 0
+
+    def push(self, event):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1  # deque con maxlen descarta el más viejo
+        self.queue.append(event)
+        self.ready.set()
+
+    async def next_batch(self, timeout):
+        """Eventos pendientes; lista vacía si pasó `timeout` sin novedades"""
+        if not self.queue:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.ready.clear()
+        batch = list(self.queue)
+        self.queue.clear()
+        return batch
+
+class LiveFeedHub:
+    def __init__(self):
+        self.subscribers = set()
+        self.seq = 0
+        self.published = 0
+
+    def subscribe(self, server_id=None):
+        subscriber = FeedSubscriber(server_id)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, server_id, event_type, **data):
+        """Serializa el evento una sola vez y lo encola en cada suscriptor interesado"""
+        if not self.subscribers:
+            return
+        self.seq += 1
+        self.published += 1
+        payload = json.dumps({'seq': self.seq, 'type': event_type, 'server_id': server_id,
+                              'ts': time.time(), **data}, ensure_ascii=False)
+        event = (payload, f"id: {self.seq}\nevent: {event_type}\ndata: {payload}\n\n".encode('utf-8'))
+        for subscriber in self.subscribers:
+            if subscriber.server_id is None or subscriber.server_id == server_id:
+                subscriber.push(event)
+
+    def describe(self):
+        dropped = sum(subscriber.dropped for subscriber in self.subscribers)
+        return f"{len(self.subscribers)} suscriptores, {self.published} eventos, {dropped} descartados"
+
+live_feed = LiveFeedHub()
+
+def publish_snapshot_deltas(server_id, old_info, new_info):
+    """Compara dos ServerInfo del mismo servidor y publica lo que cambió"""
+    if not live_feed.subscribers:
+        return
     
-    for server_info in servers_info:
-        if "Online" in server_info.status:
-            online_count += 1
-            total_players += server_info.players
-            
-            # Verificar si hay partido activo
-            if (server_info.match_info and 
-                server_info.match_info['period'].upper() in ['FIRST HALF', 'SECOND HALF', 'PLAYING']):
-                active_matches += 1
+    if new_info.status != old_info.status:
+        live_feed.publish(server_id, 'status', status=new_info.status)
+    if new_info.players != old_info.players:
+        live_feed.publish(server_id, 'players', players=new_info.players, max_players=new_info.max_players)
     
-    # Resumen general
-    summary = f"**🌐 Servidores Online:** {online_count}/{len(servers_info)}\n"
-    summary += f"**👥 Jugadores Totales:** {total_players}\n"
-    summary += f"**⚽ Partidos Activos:** {active_matches}"
+    new_match = new_info.match_info
+    if not new_match:
+        return
+    old_match = old_info.match_info or {}
     
-    embed.add_field(
-        name="📊 Resumen General",
-        value=summary,
-        inline=False
-    )
+    if new_match.get('period') != old_match.get('period'):
+        live_feed.publish(server_id, 'period', period=new_match.get('period'))
     
-    embed.set_footer(
-        text=f"🔄 Actualizado con Match Info JSON | {datetime.now().strftime('%H:%M:%S')}"
-    )
+    score = match_score(new_match)
+    known_goals = Counter(goal_identity(goal) for goal in old_match.get('goals_detail', ()))
+    for goal in unseen_goals(new_match.get('goals_detail', ()), known_goals):
+        live_feed.publish(server_id, 'goal', **goal, score=score)
     
-    return embed
+    if score != match_score(old_match):
+        live_feed.publish(server_id, 'score', team_home=new_match.get('team_home'), team_away=new_match.get('team_away'),
+                          goals_home=score[0], goals_away=score[1])
 
-# ============= FUNCIÓN DE AUTO-UPDATE =============
+async def api_events_sse(request):
+    """GET /events[?server=id] - Server-Sent Events"""
+    subscriber = live_feed.subscribe(request.query.get('server'))
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    await response.prepare(request)
+    try:
+        while True:
+            batch = await subscriber.next_batch(LIVE_FEED_HEARTBEAT)
+            if batch:
+                await response.write(b''.join(frame for _, frame in batch))
+            else:
+                await response.write(b': ping\n\n')
+    except (ConnectionResetError, asyncio.CancelledError):
+        pass
+    finally:
+        live_feed.unsubscribe(subscriber)
+    return response
 
-async def auto_update_status_detailed(channel, messages, initial_servers_info):
-    """Función que actualiza automáticamente con tolerancia a conexiones lentas"""
-    update_count = 0
-    
+async def api_events_ws(request):
+    """GET /ws[?server=id] - mismo feed por WebSocket (un mensaje JSON por evento)"""
+    ws = web.WebSocketResponse(heartbeat=LIVE_FEED_HEARTBEAT)
+    await ws.prepare(request)
+    subscriber = live_feed.subscribe(request.query.get('server'))
+    sender = asyncio.create_task(feed_to_websocket(ws, subscriber))
     try:
-        while True:  # Loop infinito
-            await asyncio.sleep(90)  # Aumentado a 90 segundos para dar más tiempo
-            update_count += 1
-            
-            logger.info(f"🔄 Auto-update PERSISTENTE #{update_count} para canal {channel.id}")
-            
-            # Mensaje de "actualizando" en el primer mensaje
-            if len(messages) > 0:
-                updating_embed = discord.Embed(
-                    title="🔄 Actualizando servidores...",
-                    description=f"Actualización #{update_count} - Obteniendo información persistente...",
-                    color=0xffaa00
-                )
-                try:
-                    await messages[0].edit(embed=updating_embed)
-                except:
-                    pass
-            
-            # Obtener información actualizada de todos los servidores (PERSISTENTE)
-            servers_info = []
-            for i, server in enumerate(SERVERS):
-                logger.info(f"🔄 Auto-update: procesando {server['name']} ({i+1}/{len(SERVERS)})")
-                
-                # Actualizar mensaje de progreso
-                if len(messages) > 0:
-                    updating_embed.description = f"Actualización #{update_count} - Procesando {server['name']} ({i+1}/{len(SERVERS)})"
-                    try:
-                        await messages[0].edit(embed=updating_embed)
-                    except:
-                        pass
-                
-                server_info = await get_server_info_robust(server)
-                servers_info.append(server_info)
-            
-            # Actualizar mensaje de resumen (primer mensaje)
-            if len(messages) > 0:
-                status_embed = create_status_embed(servers_info)
-                status_embed.set_footer(
-                    text=f"🔄 Auto-actualización PERSISTENTE #{update_count} | Próxima actualización en 90s | {datetime.now().strftime('%H:%M:%S')}"
-                )
-                
-                try:
-                    await messages[0].edit(embed=status_embed)
-                except Exception as e:
-                    logger.error(f"❌ Error actualizando resumen: {e}")
-            
-            # Actualizar mensajes de detalles (resto de mensajes)
-            for i, server_info in enumerate(servers_info):
-                if i + 1 < len(messages):  # +1 porque el primer mensaje es el resumen
-                    match_embed = create_match_embed_improved(server_info)
-                    try:
-                        await messages[i + 1].edit(embed=match_embed)
-                    except Exception as e:
-                        logger.error(f"❌ Error actualizando detalle {server_info.name}: {e}")
-            
-            logger.info(f"✅ Auto-update PERSISTENTE #{update_count} completado")
-    
-    except asyncio.CancelledError:
-        logger.info(f"🛑 Auto-update PERSISTENTE cancelado para canal {channel.id}")
-    except Exception as e:
-        logger.error(f"❌ Error fatal en auto-update PERSISTENTE: {e}")
+        async for _ in ws:
+            pass  # Feed de solo lectura: se ignoran los mensajes del cliente
     finally:
-        # Limpiar el registro del canal
-        if channel.id in active_status_channels:
-            del active_status_channels[channel.id]
-        logger.info(f"🧹 Auto-update PERSISTENTE limpiado para canal {channel.id}")
+        sender.cancel()
+        live_feed.unsubscribe(subscriber)
+    return ws
 
-# 2. MEJORAR LA FUNCIÓN get_server_info_robust
-async def get_server_info_robust(server):
-    """Obtiene información completa del servidor con conexión ULTRA PERSISTENTE"""
-    
-    # Validar configuración del servidor
-    if not server.get('rcon_ports'):
-        logger.error(f"❌ Servidor {server.get('name', 'Unknown')} sin puertos RCON definidos")
-        return ServerInfo(
-            name=server.get('name', 'Unknown'),
-            status="🔴 Error - Sin puertos RCON"
-        )
-    
+async def feed_to_websocket(ws, subscriber):
     try:
-        logger.info(f"📡 Consultando servidor ULTRA ROBUSTO: {server['name']} (ID: {server.get('id', 'unknown')})")
-        
-        # 1. Información básica con A2S_INFO (timeout aumentado)
-        a2s_info = A2SQuery.query_server(server['ip'], server['port'], timeout=12)  # Timeout aumentado
-        
-        if not a2s_info:
-            logger.warning(f"❌ A2S_INFO falló para {server['name']}")
-            return ServerInfo(
-                name=server['name'],
-                status="🔴 Offline"
-            )
-        
-        logger.info(f"✅ A2S_INFO exitoso para {server['name']}: {a2s_info['players']}/{a2s_info['max_players']}")
-        
-        # 2. Información del partido con método ULTRA PERSISTENTE
-        match_result = await RCONManager.get_match_info_json_persistent(server, RCON_PASSWORD)
-        
-        match_info = None
-        connection_details = match_result.get('connection_info', {})
-        
-        if match_result['success'] and match_result['data']:
-            logger.info(f"📊 JSON PERSISTENTE obtenido para {server['name']}: {len(str(match_result['data']))} caracteres en {match_result.get('total_time', 0):.2f}s")
-            
-            # SIEMPRE intentar parsear el JSON
-            match_info = parse_match_info(match_result['data'])
-            
-            if match_info:
-                logger.info(f"✅ Match info PERSISTENTE parseada: {match_info['team_home']} {match_info['goals_home']}-{match_info['goals_away']} {match_info['team_away']} ({match_info['time_display']})")
-            else:
-                logger.warning(f"⚠️ No se pudo parsear match info para {server['name']} (JSON obtenido pero parsing falló)")
-        else:
-            logger.warning(f"⚠️ No se pudo obtener JSON para {server['name']} después de {match_result.get('total_time', 0):.2f}s: {match_result['error']}")
-            match_info = None
-        
-        return ServerInfo(
-            name=server['name'],
-            status="🟢 Online",
-            players=a2s_info['players'],
-            max_players=a2s_info['max_players'],
-            map_name=a2s_info['map_name'],
-            match_info=match_info,
-            basic_info=a2s_info
-        )
-        
-    except Exception as e:
-        logger.error(f"❌ Error obteniendo info ULTRA ROBUSTA de {server['name']}: {e}")
-        return ServerInfo(
-            name=server['name'],
-            status="🔴 Error General",
-        )
-        
+        while not ws.closed:
+            for payload, _ in await subscriber.next_batch(LIVE_FEED_HEARTBEAT):
+                await ws.send_str(payload)
+    except ConnectionResetError:
+        pass
+
 def validate_server_config():
     """
     Valida que la configuración de servidores sea segura
@@ -1360,11 +4397,33 @@ async def on_ready():
     logger.info("="*60)
     logger.info(f"🎮 IOSoccer Bot INICIADO - VERSIÓN CORREGIDA")
     logger.info(f"📊 Resumen de conectividad: {total_working}/{total_ports} puertos RCON funcionales")
-    logger.info(f"🔧 Usando rcon-client con Match Info JSON mejorado")
+    logger.info(f"🔧 Usando cliente RCON nativo con respuestas multi-paquete")
     logger.info(f"🛡️ Modo seguro: Solo puertos específicos por servidor")
     logger.info(f"🎯 Parsing mejorado para tiempo real y marcadores")
     logger.info("="*60)
     active_status_channels.clear()
+    
+    if CAPTURE_DIR and not traffic_recorder.active:
+        traffic_recorder.start(CAPTURE_DIR)
+    
+    # Sesiones RCON autenticadas listas para el primer sv_matchinfojson + keepalive
+    for server, result in zip(SERVERS, connectivity_results):
+        for port in result['working_ports']:
+            asyncio.create_task(warm_rcon_sessions(server['ip'], port, RCON_PASSWORD))
+    start_rcon_keepalive()
+    
+    # 4. Primer snapshot en segundo plano para que !status responda al instante,
+    #    después los loops A2S (rápido) y RCON (lento) lo mantienen al día
+    for server in server_registry.polled_servers():
+        schedule_snapshot_refresh(server)
+    start_polling_loops()
+    
+    # 5. Logs UDP (push) y vigilantes de partidos en vivo (avisos de gol)
+    await start_log_receiver()
+    start_live_watchers()
+    
+    # 6. API HTTP de solo lectura sobre los snapshots
+    await start_http_api()
 logger.info("🧹 Auto-updates previos limpiados al iniciar")
 @bot.command(name='test_persistent')
 async def test_persistent_connection(ctx, server_num: int = 1):
@@ -1438,6 +4497,8 @@ async def test_persistent_connection(ctx, server_num: int = 1):
     await message.edit(embed=embed)
     
 # Comando para diagnóstico completo
+DIAGNOSE_LOG_LINES = 5  # Eventos recientes por servidor en !diagnose (límite de 1024 chars por field)
+
 @bot.command(name='diagnose')
 async def diagnose_system(ctx):
     """Diagnóstico completo del sistema RCON"""
@@ -1515,9 +4576,64 @@ async def diagnose_system(ctx):
         else:
             status = f"❌ Sin puertos funcionales\n{connectivity_test['error'][:100]}..."
         
+        # Salud observada (base de los timeouts adaptativos)
+        rcon_port = server['rcon_ports'][0]
+        status += f"\n📈 A2S: {get_server_health(server['ip'], server['port'], 'a2s').describe()}"
+        status += f"\n📈 JSON: {get_server_health(server['ip'], rcon_port, 'matchinfo').describe()}"
+        
+        # Eventos recientes del buffer en memoria (servidor + sus direcciones A2S/RCON)
+        recent = server_log_ring.recent(
+            [server.get('id', server['name']), f"{server['ip']}:{server['port']}"] +
+            [f"{server['ip']}:{port}" for port in server['rcon_ports']],
+            limit=DIAGNOSE_LOG_LINES
+        )
+        if recent:
+            status += "\n📜 Recientes:\n" + "\n".join(
+                f"`{datetime.fromtimestamp(created).strftime('%H:%M:%S')}` {text[:80]}" for created, _, text in recent
+            )
+        
         embed.add_field(
             name=f"🎮 {server['name']}",
-            value=status,
+            value=status[:1024],
+            inline=False
+        )
+    
+    embed.add_field(
+        name="✏️ Ediciones de Discord",
+        value=discord_edits.describe(),
+        inline=False
+    )
+    embed.add_field(
+        name="🔌 Pool RCON",
+        value=rcon_pool.describe(),
+        inline=False
+    )
+    embed.add_field(
+        name="🗂️ Servidores por guild",
+        value=f"{len(server_registry.guilds)} guilds con lista propia, "
+              f"{len(server_registry.polled_servers())} servidores sondeados",
+        inline=False
+    )
+    embed.add_field(
+        name="⏱️ Ciclos de auto-update",
+        value=status_cycle_stats.describe(),
+        inline=False
+    )
+    embed.add_field(
+        name="🚦 Gate RCON",
+        value=f"{rcon_gate_stats['fetched']} consultas, {rcon_gate_stats['skipped']} omitidas por A2S",
+        inline=False
+    )
+    if log_receiver.transport is not None:
+        embed.add_field(
+            name="📥 Logs UDP",
+            value=log_receiver.describe(),
+            inline=False
+        )
+    if http_api_runner is not None:
+        embed.add_field(
+            name="📡 Feed en vivo",
+            value=live_feed.describe(),
             inline=False
         )
     
@@ -1526,6 +4642,82 @@ async def diagnose_system(ctx):
     
     await message.edit(embed=embed)
 
+@bot.command(name='capture')
+async def capture_command(ctx, action: str = 'status'):
+    """
+    (Admin) Captura de tráfico A2S/RCON para fixtures de reproducción
+    Uso: !capture on | off | status
+    """
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.send("❌ Solo administradores")
+        return
+    
+    action = action.lower()
+    if action == 'on':
+        traffic_recorder.start(CAPTURE_DIR or 'fixtures')
+        await ctx.send(f"🎙️ Captura iniciada: `{traffic_recorder.path}`")
+    elif action == 'off':
+        if not traffic_recorder.active:
+            await ctx.send("❌ No hay captura activa")
+            return
+        traffic_recorder.stop()
+        await ctx.send(f"🎙️ Captura detenida: {traffic_recorder.records} registros en `{traffic_recorder.path}`")
+    elif traffic_recorder.active:
+        await ctx.send(f"🎙️ Capturando: {traffic_recorder.records} registros en `{traffic_recorder.path}`")
+    else:
+        await ctx.send("🎙️ Captura inactiva. Usa `!capture on`")
+
+@bot.command(name='profile')
+async def profile_command(ctx, cycles: int = 1, seconds: int = 300):
+    """
+    (Admin) Perfila el bot en vivo y adjunta el reporte
+    Uso: !profile [ciclos] [segundos] - termina al completar los ciclos o al vencer el tiempo (ciclos=0: solo tiempo)
+    """
+    global active_profile
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.send("❌ Solo administradores")
+        return
+    
+    if active_profile is not None:
+        await ctx.send("❌ Ya hay un perfilado en curso")
+        return
+    
+    if cycles < 0 or seconds < 1 or seconds > PROFILE_MAX_SECONDS:
+        await ctx.send(f"❌ Parámetros inválidos. Usa ciclos >= 0 y segundos entre 1 y {PROFILE_MAX_SECONDS}")
+        return
+    
+    active_profile = ProfileSession(ctx.channel, cycles, seconds)
+    active_profile.start()
+    
+    cycles_text = f"{cycles} ciclos o " if cycles else ""
+    await ctx.send(f"🩺 Perfilado iniciado: {cycles_text}{seconds}s (cProfile + tracemalloc)")
+
+@bot.command(name='trace')
+async def trace_command(ctx, action: str = None):
+    """
+    (Admin) Descarga las trazas por etapa como archivo Chrome/Perfetto
+    Uso: !trace o !trace clear
+    """
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.send("❌ Solo administradores")
+        return
+    
+    if action and action.lower() in ['clear', 'limpiar']:
+        tracer.spans.clear()
+        await ctx.send("🧹 Buffer de trazas vaciado")
+        return
+    
+    if not tracer.spans:
+        await ctx.send("❌ Todavía no hay trazas registradas")
+        return
+    
+    trace_bytes = json.dumps(tracer.to_chrome_trace()).encode('utf-8')
+    filename = f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    await ctx.send(
+        f"🧵 {len(tracer.spans)} spans. Abrir en https://ui.perfetto.dev o chrome://tracing",
+        file=discord.File(io.BytesIO(trace_bytes), filename=filename)
+    )
+
 @bot.command(name='status')
 async def server_status(ctx, auto_update: str = None):
     """
@@ -1550,27 +4742,41 @@ async def server_status(ctx, auto_update: str = None):
         del active_status_channels[ctx.channel.id]
         logger.info(f"🔄 Auto-update anterior cancelado para canal {ctx.channel.id}")
     
-    # Mensaje de carga inicial
+    # Mensaje de carga (solo si algún servidor todavía no tiene snapshot)
     loading_embed = discord.Embed(
         title="🔄 Consultando servidores...",
         description="Obteniendo información A2S + Match Info JSON",
         color=0xffff00
     )
-    loading_message = await ctx.send(embed=loading_embed)
+    loading_message = None
     
-    # Obtener información de todos los servidores
+    # Obtener información de los servidores de esta guild desde los snapshots
+    servers = servers_for_guild(ctx.guild)
     servers_info = []
-    for i, server in enumerate(SERVERS):
-        loading_embed.description = f"Analizando {server['name']} ({i+1}/{len(SERVERS)})"
+    snapshots = []
+    for i, server in enumerate(servers):
+        snapshot = server_snapshots.get(snapshot_key(server))
+        if snapshot:
+            # Respuesta inmediata; si el snapshot es viejo se refresca en segundo plano
+            schedule_snapshot_refresh(server)
+            servers_info.append(server_info_for(server, snapshot['info']))
+            snapshots.append(snapshot)
+            continue
+        
+        if loading_message is None:
+            loading_message = await ctx.send(embed=loading_embed)
+        
+        loading_embed.description = f"Analizando {server['name']} ({i+1}/{len(servers)})"
         loading_embed.add_field(
             name="📡 Progreso",
-            value=f"{'✅ ' * i}{'🔄 ' if i < len(SERVERS) else ''}{'⏳ ' * (len(SERVERS) - i - 1)}",
+            value=f"{'✅ ' * i}{'🔄 ' if i < len(servers) else ''}{'⏳ ' * (len(servers) - i - 1)}",
             inline=False
         )
         await loading_message.edit(embed=loading_embed)
         
-        server_info = await get_server_info_robust(server)
+        server_info = await get_server_info_live(server)
         servers_info.append(server_info)
+        snapshots.append(server_snapshots.get(snapshot_key(server)))
         
         # Log del resultado para debugging
         if server_info.match_info:
@@ -1582,25 +4788,45 @@ async def server_status(ctx, auto_update: str = None):
         loading_embed.clear_fields()
     
     # Eliminar mensaje de carga
-    await loading_message.delete()
+    if loading_message is not None:
+        await loading_message.delete()
+    
+    auto_requested = auto_update and auto_update.lower() in ['auto', 'automatico', 'continuo']
+    
+    if STATUS_LAYOUT == 'compact':
+        # Resumen + detalles en la menor cantidad de mensajes posible
+        footer_text = (f"🔄 Auto-actualización ACTIVADA | Actualiza cada 1 minuto | {datetime.now().strftime('%H:%M:%S')}"
+                       if auto_requested else f"🕐 {datetime.now().strftime('%H:%M:%S')}")
+        all_messages = await send_compact_status(ctx.channel, build_status_embeds(servers_info, snapshots, footer_text))
+        
+        if auto_requested:
+            task = asyncio.create_task(auto_update_status_detailed(ctx.channel, all_messages))
+            active_status_channels[ctx.channel.id] = {
+                'messages': all_messages,
+                'channel': ctx.channel,
+                'task': task
+            }
+            logger.info(f"🔄 Auto-update COMPACTO iniciado para canal {ctx.channel.id} con {len(all_messages)} mensajes")
+        return
     
     # Crear embed de status principal
     status_embed = create_status_embed(servers_info)
     
     # Verificar si se solicitó auto-update
-    if auto_update and auto_update.lower() in ['auto', 'automatico', 'continuo']:
+    if auto_requested:
         # Activar auto-update
         status_embed.set_footer(
             text=f"🔄 Auto-actualización ACTIVADA | Actualiza cada 1 minuto | {datetime.now().strftime('%H:%M:%S')}"
         )
+        add_snapshot_age_footer(status_embed, oldest_snapshot(snapshots))
         
         # ← CAMBIO IMPORTANTE: Enviar RESUMEN + DETALLES desde el inicio
         summary_message = await ctx.send(embed=status_embed)
         
         # Enviar detalles de cada servidor
         detail_messages = []
-        for server_info in servers_info:
-            match_embed = create_match_embed_improved(server_info)
+        for server_info, snapshot in zip(servers_info, snapshots):
+            match_embed = add_snapshot_age_footer(create_match_embed_improved(server_info), snapshot)
             detail_msg = await ctx.send(embed=match_embed)
             detail_messages.append(detail_msg)
         
@@ -1608,11 +4834,12 @@ async def server_status(ctx, auto_update: str = None):
         all_messages = [summary_message] + detail_messages
         
         # Iniciar tarea de auto-update
-        task = asyncio.create_task(auto_update_status_detailed(ctx.channel, all_messages, servers_info))
+        task = asyncio.create_task(auto_update_status_detailed(ctx.channel, all_messages))
         
         # Registrar el canal y la tarea
         active_status_channels[ctx.channel.id] = {
             'messages': all_messages,
+            'channel': ctx.channel,
             'task': task
         }
         
@@ -1627,11 +4854,12 @@ async def server_status(ctx, auto_update: str = None):
             pass
     else:
         # Status normal sin auto-update
+        add_snapshot_age_footer(status_embed, oldest_snapshot(snapshots))
         summary_message = await ctx.send(embed=status_embed)
         
         # Mostrar detalles individuales de cada servidor
-        for server_info in servers_info:
-            match_embed = create_match_embed_improved(server_info)
+        for server_info, snapshot in zip(servers_info, snapshots):
+            match_embed = add_snapshot_age_footer(create_match_embed_improved(server_info), snapshot)
             await ctx.send(embed=match_embed)
             
 @bot.command(name='stop_status')
@@ -1669,11 +4897,20 @@ async def stop_auto_status(ctx):
 @bot.command(name='server')
 async def individual_server(ctx, server_num: int = 1):
     """Información detallada de un servidor específico"""
-    if server_num < 1 or server_num > len(SERVERS):
-        await ctx.send(f"❌ Servidor inválido. Usa 1-{len(SERVERS)}")
+    servers = servers_for_guild(ctx.guild)
+    if server_num < 1 or server_num > len(servers):
+        await ctx.send(f"❌ Servidor inválido. Usa 1-{len(servers)}")
         return
     
-    server = SERVERS[server_num - 1]
+    server = servers[server_num - 1]
+    
+    # Respuesta inmediata desde el snapshot si existe
+    snapshot = server_snapshots.get(snapshot_key(server))
+    if snapshot:
+        schedule_snapshot_refresh(server)
+        match_embed = create_match_embed_improved(server_info_for(server, snapshot['info']))
+        await ctx.send(embed=add_snapshot_age_footer(match_embed, snapshot))
+        return
     
     loading_embed = discord.Embed(
         title=f"🔄 Consultando {server['name']}...",
@@ -1682,10 +4919,167 @@ async def individual_server(ctx, server_num: int = 1):
     )
     message = await ctx.send(embed=loading_embed)
     
-    server_info = await get_server_info_robust(server)
+    server_info = await get_server_info_live(server)
     match_embed = create_match_embed_improved(server_info)
     
-    await message.edit(embed=match_embed)
+    await message.edit(embed=add_snapshot_age_footer(match_embed, server_snapshots.get(snapshot_key(server))))
+
+@bot.command(name='top')
+async def top_command(ctx, stat: str = 'goles', server_num: int = 0):
+    """
+    Clasificación acumulada de goleadores o asistidores
+    Uso: !top [goles|asistencias] [0=global | 1-2=servidor]
+    """
+    stat_key = 'assists' if stat.lower().startswith('asist') else 'goals'
+    servers = servers_for_guild(ctx.guild)
+    
+    if server_num < 0 or server_num > len(servers):
+        await ctx.send(f"❌ Servidor inválido. Usa 0 (global) o 1-{len(servers)}")
+        return
+    
+    if server_num == 0:
+        board = leaderboards.board()
+        scope = "Global"
+    else:
+        server = servers[server_num - 1]
+        board = leaderboards.board(server.get('id', server['name']))
+        scope = server['name']
+    
+    label = "Asistidores" if stat_key == 'assists' else "Goleadores"
+    embed = discord.Embed(
+        title=f"🏅 Top {label} - {scope}",
+        color=0xffd700
+    )
+    
+    top_entries = board.top(stat_key)
+    if top_entries:
+        medals = ["🥇", "🥈", "🥉"]
+        lines = []
+        for i, (player_name, count) in enumerate(top_entries):
+            medal = medals[i] if i < 3 else f"**{i + 1}.**"
+            lines.append(f"{medal} **{player_name}** ({count})")
+        embed.description = "\n".join(lines)
+    else:
+        embed.description = "Todavía no hay datos registrados"
+    
+    await ctx.send(embed=embed)
+
+@bot.command(name='servers')
+async def list_guild_servers(ctx):
+    """Lista los servidores que muestra esta guild"""
+    servers = servers_for_guild(ctx.guild)
+    own_list = ctx.guild is not None and str(ctx.guild.id) in server_registry.guilds
+    
+    embed = discord.Embed(
+        title="🗂️ Servidores de esta guild" if own_list else "🗂️ Servidores (lista por defecto)",
+        color=0x0099ff
+    )
+    embed.description = "\n".join(
+        f"**{i + 1}.** {server['name']} - `{server['ip']}:{server['port']}`"
+        f"{'' if rcon_enabled(server) else ' (solo A2S)'}"
+        for i, server in enumerate(servers)
+    )
+    if not own_list:
+        embed.set_footer(text="Un administrador puede armar la lista propia con !addserver")
+    await ctx.send(embed=embed)
+
+@bot.command(name='addserver')
+async def add_guild_server(ctx, address: str, *, name: str = None):
+    """
+    Agrega un servidor (solo A2S) a la lista de esta guild
+    Uso: !addserver <ip:puerto> <nombre>
+    """
+    if ctx.guild is None or not ctx.author.guild_permissions.administrator:
+        await ctx.send("❌ Solo administradores")
+        return
+    
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit() or not name:
+        await ctx.send("❌ Uso: `!addserver <ip:puerto> <nombre>`")
+        return
+    
+    try:
+        ip = await resolve_public_ip(host, int(port))
+        entry = server_registry.add(ctx.guild.id, ip, int(port), name.strip())
+    except ValueError as e:
+        await ctx.send(f"❌ {e}")
+        return
+    
+    # Si la dirección ya se sondeaba para otra guild no se abre nada nuevo
+    start_polling_loops()
+    start_live_watchers()
+    if log_receiver.transport is not None:
+        log_receiver.set_servers(server_registry.polled_servers())
+    schedule_snapshot_refresh(entry)
+    
+    logger.info(f"🗂️ Guild {ctx.guild.id} agregó {entry['name']} ({ip}:{port}, snapshot {snapshot_key(entry)})")
+    await ctx.send(f"✅ **{entry['name']}** agregado (`{ip}:{port}`, solo A2S). "
+                   f"Para el detalle del partido: `!serverrcon <n> <puerto_rcon> <contraseña>`")
+
+@bot.command(name='serverrcon')
+async def set_guild_server_rcon(ctx, server_num: int, rcon_port: str, *, password: str = None):
+    """
+    Configura la RCON propia de un servidor de la guild (el mensaje se borra)
+    Uso: !serverrcon <n> <puerto_rcon> <contraseña> | !serverrcon <n> off
+    """
+    # La contraseña no queda en el canal
+    try:
+        await ctx.message.delete()
+    except Exception:
+        pass
+    
+    if ctx.guild is None or not ctx.author.guild_permissions.administrator:
+        await ctx.send("❌ Solo administradores")
+        return
+    
+    servers = server_registry.guilds.get(str(ctx.guild.id), [])
+    if server_num < 1 or server_num > len(servers):
+        await ctx.send("❌ Servidor inválido. Mira la numeración con `!servers`")
+        return
+    
+    disable = rcon_port.lower() == 'off'
+    if not disable and (not rcon_port.isdigit() or not password):
+        await ctx.send("❌ Uso: `!serverrcon <n> <puerto_rcon> <contraseña>` o `!serverrcon <n> off`")
+        return
+    
+    try:
+        shared = server_registry.set_rcon(ctx.guild.id, server_num - 1,
+                                          None if disable else int(rcon_port), None if disable else password)
+    except ValueError as e:
+        await ctx.send(f"❌ {e}")
+        return
+    
+    rcon_gate_state.pop(snapshot_key(shared), None)
+    if disable:
+        update_snapshot(shared, {'match_info': None})
+    logger.info(f"🗂️ Guild {ctx.guild.id}: RCON {'desactivada' if disable else 'configurada'} para {shared['id']}")
+    await ctx.send(f"✅ RCON {'desactivada (solo A2S)' if disable else 'configurada'} para **{servers[server_num - 1]['name']}**")
+
+@bot.command(name='removeserver')
+async def remove_guild_server(ctx, server_num: int):
+    """
+    Quita un servidor de la lista de esta guild (con la lista vacía se vuelve a la por defecto)
+    Uso: !removeserver <número de !servers>
+    """
+    if ctx.guild is None or not ctx.author.guild_permissions.administrator:
+        await ctx.send("❌ Solo administradores")
+        return
+    
+    servers = server_registry.guilds.get(str(ctx.guild.id), [])
+    if server_num < 1 or server_num > len(servers):
+        await ctx.send("❌ Servidor inválido. Mira la numeración con `!servers`" if servers
+                       else "❌ Esta guild usa la lista por defecto")
+        return
+    
+    entry, orphan = server_registry.remove(ctx.guild.id, server_num - 1)
+    if orphan is not None:
+        # Ninguna guild lo vigila ya: dejar de sondearlo
+        stop_server_tasks(orphan)
+        if log_receiver.transport is not None:
+            log_receiver.set_servers(server_registry.polled_servers())
+    
+    logger.info(f"🗂️ Guild {ctx.guild.id} quitó {entry['name']} ({entry['ip']}:{entry['port']})")
+    await ctx.send(f"🗑️ **{entry['name']}** quitado de la lista")
 
 @bot.command(name='rcon')
 async def test_rcon_simple(ctx, server_num: int = 1, *, command: str = "status"):
@@ -2054,7 +5448,7 @@ async def debug_parse(ctx, server_num: int = 1):
         # Paso 4: Jugadores
         players = match_core.get('players', [])
         if players:
-            real_players = count_real_players(players)
+            real_players = count_real_players(players, get_schema_plan(json_data, snapshot_key(server)))
             players_info = f"**Total jugadores:** {len(players)}\n"
             players_info += f"**Jugadores reales:** {real_players}\n"
             
@@ -2139,21 +5533,19 @@ async def rcon_fix_guide(ctx):
         color=0xff6600
     )
     
-    # Instalación rcon-client
+    # Test con el cliente RCON integrado (SourceRCONClient, sin dependencias extra)
     install_guide = """```bash
-# 1. Instalar rcon-client (Python)
-pip install rcon
-
-# 2. Test manual desde terminal:
+# 1. No hace falta instalar nada: el bot trae su propio cliente RCON
+# 2. Test manual desde terminal, en la carpeta del bot:
 python -c "
-from rcon import Client
-with Client('45.235.98.16', 27018, passwd='tu_password') as client:
+from status_servers import SourceRCONClient
+with SourceRCONClient('45.235.98.16', 27018, passwd='tu_password') as client:
     print(client.run('sv_matchinfojson'))
 "
 ```"""
     
     embed.add_field(
-        name="📥 1. Instalación y Test",
+        name="📥 1. Test de RCON",
         value=install_guide,
         inline=False
     )
@@ -2239,12 +5631,20 @@ async def help_command(ctx):
     ("🎮 !status", "Estado de todos los servidores"),
     ("🔄 !status auto", "Status con auto-actualización cada 30s (60 min)"),
     ("🛑 !stop_status", "Detener auto-actualización del status"),
-    ("⚽ !server [1-2]", "Información detallada de un servidor específico"),
+    ("⚽ !server [n]", "Información detallada de un servidor específico"),
+    ("🗂️ !servers", "Servidores que muestra esta guild"),
+    ("➕ !addserver <ip:puerto> <nombre>", "(Admin) Agrega un servidor (solo A2S) a la lista de la guild"),
+    ("🔑 !serverrcon <n> <puerto_rcon> <contraseña>", "(Admin) RCON propia del servidor para ver el partido"),
+    ("➖ !removeserver <n>", "(Admin) Quita un servidor de la lista de la guild"),
     ("📋 !matchjson [1-2]", "JSON completo del partido con análisis"),
+    ("🏅 !top [goles|asistencias] [0-n]", "Clasificación acumulada (0 = global)"),
     ("🔍 !debug_parse [1-2]", "(Admin) Debug paso a paso del parsing"),
     ("🔧 !rcon [1-2] [comando]", "(Admin) Ejecuta comando RCON específico"),
     ("🧪 !test_all_commands [1-2]", "(Admin) Prueba todos los comandos IOSoccer"),
     ("🔍 !diagnose", "(Admin) Diagnóstico completo del sistema"),
+    ("🧵 !trace [clear]", "(Admin) Trazas por etapa (Chrome/Perfetto)"),
+    ("🩺 !profile [ciclos] [segundos]", "(Admin) Perfilado en vivo con cProfile y tracemalloc"),
+    ("🎙️ !capture [on|off]", "(Admin) Captura tráfico A2S/RCON como fixtures"),
     ("🛠️ !fix_guide", "Guía para configurar RCON correctamente"),
     ("🏓 !ping", "Latencia del bot"),
 ]
@@ -2284,6 +5684,13 @@ async def on_command_error(ctx, error):
 # ============= EJECUTAR BOT =============
 
 if __name__ == "__main__":
+    # Modo reproducción: python status_servers.py replay <archivo_o_directorio>
+    if len(sys.argv) >= 3 and sys.argv[1] == 'replay':
+        logger.setLevel(logging.WARNING)
+        replay_result = replay_fixtures(sys.argv[2])
+        print(json.dumps(replay_result, indent=2, ensure_ascii=False))
+        sys.exit(1 if replay_result['errors'] else 0)
+    
     print("🚀 Iniciando Bot IOSoccer con Match Info JSON - VERSIÓN CORREGIDA")
     print("🔧 Parsing mejorado para tiempo real y marcadores")
     print("📡 Manejo robusto de diferentes estructuras JSON")